@@ -0,0 +1,39 @@
+# === CSV HELPERS SHARED BY THE PIPELINE SCRIPTS ===
+# scripts in src/ are run directly, so src/ is on sys.path and they can
+# `from csv_io import ...`; this module only defines functions
+import csv
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from pathlib import Path
+
+CHUNK_BYTES = 8 << 20   # default CSV bytes per streamed chunk
+
+def write_csv(df, path):
+    """Save a DataFrame with arrow's multithreaded CSV writer."""
+    # pd.read_csv can hand back an object column mixing ints and strs (e.g. utterance_id
+    # in the combined debate files, str for caps formats and int for title format),
+    # which arrow rejects; the string dtype converts cleanly
+    df = df.astype({c: "string" for c in df.columns[df.dtypes == object]})
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), path)
+
+def iter_csv_arrow(path: Path, column_types: dict, block_size: int = CHUNK_BYTES):
+    """
+    Stream a CSV as DataFrame chunks with pyarrow's reader, so only one chunk
+    is resident at a time; strings stay Arrow-backed (string[pyarrow]).
+    Only the columns in column_types that the file has are parsed: other columns
+    are never read, so their types can't be mis-inferred from the first block.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), [])
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=block_size),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),  # text fields span lines
+        convert_options=pacsv.ConvertOptions(
+            column_types=column_types,
+            include_columns=[c for c in header if c in column_types],
+        ),
+    )
+    for batch in reader:
+        yield batch.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
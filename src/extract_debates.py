@@ -1,11 +1,12 @@
 import os
-import time
+import asyncio
 import logging
-import requests
+import httpx
 import pandas as pd
 from pathlib import Path
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse
+from selectolax.parser import HTMLParser
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
 import numpy as np
 
 # === BASE REPO PATH === #
@@ -16,6 +17,14 @@ METADATA_PATH = DATA_DIR / "debates_metadata.csv"
 LOG_DIR = REPO_DIR / "logs"
 LOG_FILE = LOG_DIR / "extract_transcripts.log"
 
+# === DOWNLOAD CONFIG === #
+MAX_CONCURRENCY = 16   # transcripts in flight at once
+MAX_ATTEMPTS = 3
+BACKOFF_FACTOR = 1.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+HTTP_TIMEOUT = 10
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+
 # === SETUP LOGGING === #
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 logging.basicConfig(
@@ -27,6 +36,89 @@ logging.basicConfig(
 def sanitize(text):
     return text.replace(" ", "").replace(".", "").replace(",", "").replace("/", "_")
 
+def build_filename(row):
+    year = str(row["year"])
+    number = str(row["debate_number"])
+    debate_type = sanitize(str(row["debate_type"]).capitalize())
+    cand_r = sanitize(str(row["candidate_R"])) if pd.notna(row["candidate_R"]) else None
+    cand_d = sanitize(str(row["candidate_D"])) if pd.notna(row["candidate_D"]) else None
+    cand_i = sanitize(str(row["candidate_I"])) if pd.notna(row["candidate_I"]) else None 
+
+    # handle missing candidates
+    if cand_d and cand_i:
+        candidates = f"{cand_r}_{cand_d}_{cand_i}"
+    elif cand_d:
+        candidates = f"{cand_r}_{cand_d}"
+    elif cand_i:
+        candidates = f"{cand_r}_{cand_i}"
+    else:
+        candidates = f"{cand_r}_NA"
+
+    return f"{year}_{number}_{debate_type}_{candidates}.txt"
+
+def parse_transcript(html):
+    tree = HTMLParser(html)
+    transcript_div = tree.css_first("div.field-docs-content")
+
+    if transcript_div:
+        return transcript_div.text(separator="\n", strip=True)
+    root = tree.body or tree.root  # fallback
+    return root.text(separator="\n", strip=True) if root else ""
+
+def is_retryable(exc):
+    """Retry throttling/server errors and dropped connections, not other 4xx."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRY_STATUSES
+    return isinstance(exc, httpx.TransportError)
+
+async def fetch_transcript(client, semaphore, idx, url, filepath):
+    """Download, parse and save one transcript; returns (idx, filename or None)."""
+    def log_retry(retry_state):
+        logging.warning(f"Attempt {retry_state.attempt_number} failed for {url}: {retry_state.outcome.exception()}")
+
+    async with semaphore:
+        try:
+            async for attempt in AsyncRetrying(
+                wait=wait_exponential(multiplier=BACKOFF_FACTOR, max=10),
+                stop=stop_after_attempt(MAX_ATTEMPTS),
+                retry=retry_if_exception(is_retryable),
+                before_sleep=log_retry,
+                reraise=True,
+            ):
+                with attempt:
+                    response = await client.get(url)
+                    response.raise_for_status()
+        except Exception as e:
+            logging.error(f"Failed to download {url}: {e}")
+            return idx, None
+
+    # a bad page or failed write only loses this transcript, not the whole run
+    try:
+        # parse off the event loop so other downloads keep flowing
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(None, parse_transcript, response.text)
+
+        # disk write in a worker thread too, overlapping it with the other downloads
+        await asyncio.to_thread(filepath.write_text, text, encoding="utf-8")
+    except Exception as e:
+        logging.error(f"Failed to save {url} to {filepath.name}: {e}")
+        return idx, None
+
+    logging.info(f"Downloaded: {filepath.name}")
+    return idx, filepath.name
+
+async def download_all(jobs):
+    # one client for the whole run: keep-alive connections are reused across
+    # transcripts on the same host, so TLS handshakes are paid once per host
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    async with httpx.AsyncClient(
+        http2=True,
+        limits=HTTP_LIMITS,
+        timeout=HTTP_TIMEOUT,
+        follow_redirects=True,
+    ) as client:
+        return await asyncio.gather(*[fetch_transcript(client, semaphore, *job) for job in jobs])
+
 def extract_transcripts():
     logging.info("Starting debate transcript extraction...")
 
@@ -38,64 +130,30 @@ def extract_transcripts():
     df["filename"] = df["filename"].astype("string")
     df.replace("-", np.nan, inplace=True)
 
-    for idx, row in df.iterrows():
+    jobs, downloaded = [], {}
+    cols = list(df.columns)
+    for idx, *values in df.itertuples(index=True, name=None):
+        row = dict(zip(cols, values))
         if pd.isna(row["transcript_url"]) or row.get("transcript_downloaded", False) is True:
             continue
 
-        # build filename
-        year = str(row["year"])
-        number = str(row["debate_number"])
-        debate_type = sanitize(str(row["debate_type"]).capitalize())
-        cand_r = sanitize(str(row["candidate_R"])) if pd.notna(row["candidate_R"]) else None
-        cand_d = sanitize(str(row["candidate_D"])) if pd.notna(row["candidate_D"]) else None
-        cand_i = sanitize(str(row["candidate_I"])) if pd.notna(row["candidate_I"]) else None 
-
-        # handle missing candidates
-        if cand_d and cand_i:
-            candidates = f"{cand_r}_{cand_d}_{cand_i}"
-        elif cand_d:
-            candidates = f"{cand_r}_{cand_d}"
-        elif cand_i:
-            candidates = f"{cand_r}_{cand_i}"
-        else:
-            candidates = f"{cand_r}_NA"
-
-        filename = f"{year}_{number}_{debate_type}_{candidates}.txt"
+        filename = build_filename(row)
         filepath = RAW_DIR / filename
 
         # skip if already downloaded
         if filepath.exists():
             logging.info(f"Skipping {filename}, already exists.")
-            df.at[idx, "filename"] = filename
-            df.at[idx, "transcript_downloaded"] = True
+            downloaded[idx] = filename
             continue
 
-        url = row["transcript_url"]
-
-        for attempt in range(3):
-            try:
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                soup = BeautifulSoup(response.text, "html.parser")
-                transcript_div = soup.find("div", class_="field-docs-content")
-
-                if transcript_div:
-                    text = transcript_div.get_text(separator="\n", strip=True)
-                else:
-                    text = soup.get_text(separator="\n", strip=True)  # fallback
-
-                with open(filepath, "w", encoding="utf-8") as f:
-                    f.write(text)
-
-                df.at[idx, "filename"] = filename
-                df.at[idx, "transcript_downloaded"] = True
-                logging.info(f"Downloaded: {filename}")
-                break
-            except Exception as e:
-                logging.warning(f"Attempt {attempt+1} failed for {url}: {e}")
-                time.sleep(2)
-        else:
-            logging.error(f"Failed to download {url} after 3 attempts.")
+        jobs.append((idx, row["transcript_url"], filepath))
+
+    # download all pending transcripts concurrently
+    results = asyncio.run(download_all(jobs))
+    downloaded.update((idx, filename) for idx, filename in results if filename is not None)
+    if downloaded:
+        df.loc[list(downloaded), "filename"] = list(downloaded.values())
+        df.loc[list(downloaded), "transcript_downloaded"] = True
 
     # save updated metadata
     df.to_csv(METADATA_PATH, index=False)
@@ -8,14 +8,23 @@ import os
 import re
 import time
 import json
+import shelve
+import shutil
+import asyncio
+import hashlib
 import random
+import orjson
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from tqdm import tqdm
+from sklearn.linear_model import Ridge
 
-# OpenAI >= 1.x client
-from openai import OpenAI
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# OpenAI >= 1.x clients (async for interactive calls, sync for the Batch API)
+from openai import AsyncOpenAI, OpenAI
+aclient = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+client  = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
 # === PATHS & CONFIG ===
 
@@ -23,6 +32,9 @@ REPO_DIR      = Path(__file__).resolve().parents[1]
 DATA_DIR      = REPO_DIR / "data"
 INPUT_FILE    = DATA_DIR / "rhetoric" / "debates_rhetoric.csv"
 OUTPUT_FILE   = DATA_DIR / "ideological_drift" / "debates_ideology.csv"
+BATCH_DIR     = DATA_DIR / "ideological_drift" / "batch"
+CACHE_FILE    = REPO_DIR / ".cache" / "openai_ideology"   # shelve db of parsed responses
+CHECKPOINT_DIR = OUTPUT_FILE.with_suffix(".checkpoint")  # one Parquet part per scored batch, for resuming
 
 SEED              = 42
 MIN_WORDS         = 10           # skip very short/empty utterances
@@ -31,9 +43,24 @@ ENSEMBLE_N        = 2            # how many prompt variants to average
 MODEL_NAME        = "gpt-4o-mini"
 TEMPERATURE       = 0.0
 MAX_TOKENS        = 16           # only need small JSON
+UTTERANCES_PER_CALL = 20         # utterances packed into one chat request
+TOKENS_PER_ITEM   = 48           # output ceiling per packed utterance (~2x compact JSON, room for indents)
 CHECKPOINT_EVERY  = 100          # save partial results periodically
+MAX_CONCURRENCY   = 32           # API requests in flight at once
 BACKOFF_BASE_S    = 1.0
 BACKOFF_MAX_S     = 30.0
+USE_BATCH_API     = False        # offline Batch API (50% cheaper, up to 24h turnaround)
+BATCH_MAX_REQUESTS = 50_000      # Batch API limit per input file
+BATCH_MAX_BYTES   = 190 << 20    # input files are capped at 200 MB; stay below it
+BATCH_POLL_S      = 60
+USE_EMBEDDINGS    = False        # ridge head on embeddings, chat only for training + unsure rows
+EMBED_MODEL       = "text-embedding-3-small"
+EMBED_BATCH       = 1024         # inputs per embeddings request (API max 2048)
+EMBED_TRAIN_N     = 300          # utterances labelled via chat to train the ridge head
+RIDGE_ALPHA       = 1.0
+RIDGE_HEADS       = 8            # ridge heads fit on bootstrap resamples, for uncertainty
+UNSURE_STD        = 0.15         # heads disagree by more than this (std, either axis) → re-ask via chat
+SIM_THRESHOLD     = 0.97         # cosine sim to a labelled utterance to reuse its label
 
 random.seed(SEED)
 np.random.seed(SEED)
@@ -47,6 +74,30 @@ EXAMPLES = [
     {"text": "Increase military spending and strengthen border security with strict enforcement.", "econ": 0.4, "soc": 0.8},
     {"text": "Deregulate small businesses and reduce government oversight over private life.", "econ": 0.7, "soc": -0.4},
     {"text": "Ban corporate political donations and impose strict platform rules to stop misinformation.", "econ": -0.6, "soc": 0.5},
+    {"text": "Every American deserves a guaranteed living wage and a union card if they want one.", "econ": -0.9, "soc": 0.0},
+    {"text": "Let people keep more of what they earn; the government does not spend your money better than you do.", "econ": 0.8, "soc": -0.2},
+    {"text": "We need a national ID system and more police on the streets to keep our families safe.", "econ": 0.0, "soc": 0.8},
+    {"text": "What a woman does with her own body is her decision, not the government's.", "econ": 0.0, "soc": -0.7},
+    {"text": "Break up the big banks and put Wall Street under real federal supervision.", "econ": -0.8, "soc": 0.2},
+    {"text": "Privatize Social Security accounts so workers can invest for their own retirement.", "econ": 0.8, "soc": 0.0},
+    {"text": "Drug users need treatment, not prison cells, and we should end the war on drugs.", "econ": -0.2, "soc": -0.8},
+    {"text": "Judges who go soft on criminals should be removed, and repeat offenders should serve life.", "econ": 0.2, "soc": 0.9},
+    {"text": "We will build public housing and expand Medicaid to cover every low-income family.", "econ": -0.8, "soc": 0.0},
+    {"text": "Balance the federal budget by cutting wasteful domestic programs, not by raising taxes.", "econ": 0.7, "soc": 0.1},
+    {"text": "Free speech means protecting even the ideas we hate from government censorship.", "econ": 0.0, "soc": -0.8},
+    {"text": "Schools should lead students in prayer and teach traditional values again.", "econ": 0.1, "soc": 0.7},
+    {"text": "Thank you, it is great to be here tonight with all of you.", "econ": 0.0, "soc": 0.0},
+    {"text": "My opponent has changed his position three times on this issue.", "econ": 0.0, "soc": 0.0},
+    {"text": "Raise the minimum wage and make large corporations pay their fair share.", "econ": -0.7, "soc": 0.0},
+    {"text": "Free trade agreements open markets for our farmers and lower prices for consumers.", "econ": 0.6, "soc": 0.0},
+    {"text": "We must protect American factories with tariffs and keep jobs from moving overseas.", "econ": -0.2, "soc": 0.4},
+    {"text": "The federal government should stay out of local schools and let parents choose.", "econ": 0.5, "soc": -0.4},
+    {"text": "Immigrants who came here illegally should be deported, and we will finish the wall.", "econ": 0.2, "soc": 0.9},
+    {"text": "A path to citizenship for undocumented families honors who we are as a nation.", "econ": -0.2, "soc": -0.5},
+    {"text": "Climate change demands strict federal limits on emissions and investment in clean energy.", "econ": -0.7, "soc": 0.3},
+    {"text": "Open federal lands to drilling and cut the red tape strangling energy producers.", "econ": 0.8, "soc": 0.0},
+    {"text": "Law-abiding citizens have the right to own guns without being registered by Washington.", "econ": 0.3, "soc": -0.5},
+    {"text": "The intelligence agencies need broader wiretap powers to stop the next terrorist attack.", "econ": 0.0, "soc": 0.9},
 ]
 
 def examples_block():
@@ -61,14 +112,24 @@ def examples_block():
 FEWSHOTS = examples_block()
 
 # === PROMPT VARIANTS ===
-
-SYSTEM_MSG = (
-    "You are an expert political science coder. "
-    "Your task is to map a single debate utterance to a compact political position."
+# all static instructions + few-shots live in the system message, byte-identical
+# across calls, so the API's automatic prompt caching (prefixes >= 1024 tokens)
+# can reuse them; only the utterance goes into the user message
+
+SYSTEM_INTRO = "You are an expert political science coder."
+
+# the packed request sends several numbered utterances at once, so each variant
+# also has a packed form whose task and output contract match that user message
+TASK_SINGLE = "Your task is to map a single debate utterance to a compact political position."
+TASK_PACKED = (
+    "Your task is to map each of several numbered debate utterances, independently, "
+    "to a compact political position."
 )
 
-def build_prompt_a(utterance: str) -> str:
+def system_prompt_a(task: str, output: str) -> str:
     return f"""
+{SYSTEM_INTRO} {task}
+
 Classify the ideological content of the utterance on two independent axes:
 
 Economic axis (econ):
@@ -83,19 +144,17 @@ Social axis (soc):
 
 If a signal is weak/unclear on a dimension, use 0.0.
 
-Return ONLY valid JSON with two floats in [-1, 1] and no extra keys:
-{{"econ": <float>, "soc": <float>}}
+{output}
 
 Few-shot examples:
 {FEWSHOTS}
-
-Utterance: "{utterance}"
-JSON:
 """.strip()
 
-def build_prompt_b(utterance: str) -> str:
+def system_prompt_b(task: str, output: str) -> str:
     return f"""
-You will output a strict JSON object with two keys: econ and soc. Values are floats in [-1,1].
+{SYSTEM_INTRO} {task}
+
+{output}
 
 Definitions:
 econ: economic left (-1) to economic right (+1).
@@ -108,12 +167,39 @@ Guidelines:
 
 Examples:
 {FEWSHOTS}
-
-Utterance: "{utterance}"
-JSON:
 """.strip()
 
-PROMPT_BUILDERS = [build_prompt_a, build_prompt_b]
+SYSTEM_PROMPT_A = system_prompt_a(
+    TASK_SINGLE,
+    'Return ONLY valid JSON with two floats in [-1, 1] and no extra keys:\n{"econ": <float>, "soc": <float>}',
+)
+SYSTEM_PROMPT_B = system_prompt_b(
+    TASK_SINGLE,
+    "You will output a strict JSON object with two keys: econ and soc. Values are floats in [-1,1].",
+)
+PACKED_SYSTEM_PROMPT_A = system_prompt_a(
+    TASK_PACKED,
+    "Return ONLY valid JSON with exactly one entry per utterance, using its number as id, "
+    "econ and soc as floats in [-1, 1] and no extra keys:\n"
+    '{"results": [{"id": <int>, "econ": <float>, "soc": <float>}, ...]}\n'
+    "The examples below each show one utterance; score every numbered utterance the same way.",
+)
+PACKED_SYSTEM_PROMPT_B = system_prompt_b(
+    TASK_PACKED,
+    'You will output a strict JSON object with one key, results: a list with exactly one '
+    '{"id", "econ", "soc"} object per utterance, where id is the utterance\'s number. '
+    "Values are floats in [-1,1]. Each example below shows the scores for one utterance.",
+)
+
+SYSTEM_PROMPTS = [SYSTEM_PROMPT_A, SYSTEM_PROMPT_B]
+PACKED_SYSTEM_PROMPTS = [PACKED_SYSTEM_PROMPT_A, PACKED_SYSTEM_PROMPT_B]
+
+def build_user_message(utterance: str) -> str:
+    return f'Utterance: "{utterance}"\nJSON:'
+
+def build_multi_user_message(utterances: list) -> str:
+    numbered = "\n".join(f'{k}. "{u}"' for k, u in enumerate(utterances))
+    return f"Utterances:\n{numbered}\nJSON:"
 
 # === HELPERS ===
 
@@ -125,8 +211,8 @@ def clean_text(t: str) -> str:
     t = re.sub(SPACES, " ", t).strip()
     return t
 
-def is_moderator(row) -> bool:
-    val = str(row.get("speaker", "")).strip().lower()
+def is_moderator(speaker) -> bool:
+    val = str(speaker).strip().lower()
     return val == "moderator" if SKIP_MODERATORS else False
 
 def too_short(text: str) -> bool:
@@ -139,47 +225,158 @@ def clip_unit(x):
         return 0.0
     return max(-1.0, min(1.0, xf))
 
-def call_openai(prompt: str):
+# prompt-token usage, to confirm the static system prefix is served from cache
+TOKEN_USAGE = {"prompt": 0, "cached": 0}
+# packed requests, and how many of them needed utterances resent one by one
+PACKED_USAGE = {"calls": 0, "fallback_calls": 0, "resent": 0}
+
+def request_body(system_prompt: str, utterance: str) -> dict:
+    """Chat completion parameters, shared by interactive and Batch API calls."""
+    return {
+        "model": MODEL_NAME,
+        "temperature": TEMPERATURE,
+        "max_tokens": MAX_TOKENS,
+        "response_format": {"type": "json_object"},
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user",   "content": build_user_message(utterance)},
+        ],
+    }
+
+def multi_request_body(system_prompt: str, utterances: list) -> dict:
+    body = request_body(system_prompt, "")
+    body["max_tokens"] = TOKENS_PER_ITEM * len(utterances) + MAX_TOKENS
+    body["messages"][1]["content"] = build_multi_user_message(utterances)
+    return body
+
+def cache_key(system_prompt: str, utterance: str, packed: bool = False) -> str:
+    """
+    Hash of the full single-utterance request (model, params, system + user messages).
+    Answers taken out of a packed reply get packed=True, a separate key, so single
+    calls, Batch API runs and embedding training never reuse them.
+    """
+    body = request_body(system_prompt, utterance)
+    if packed:
+        body["packed"] = True
+    payload = json.dumps(body, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def track_usage(usage):
+    if usage is None:
+        return
+    TOKEN_USAGE["prompt"] += usage.prompt_tokens or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    TOKEN_USAGE["cached"] += (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+def parse_json(content) -> dict:
+    # orjson is much faster on the hot path; the stdlib parser is kept as a
+    # fallback for anything orjson rejects (e.g. NaN literals, lone surrogates)
+    try:
+        return orjson.loads(content if isinstance(content, bytes) else content.encode())
+    except orjson.JSONDecodeError:
+        return json.loads(content)
+
+async def chat_json(body: dict, semaphore: asyncio.Semaphore) -> dict:
+    """One chat completion → parsed JSON, retrying on rate limits / timeouts."""
     backoff = BACKOFF_BASE_S
     while True:
         try:
-            resp = client.chat.completions.create(
-                model=MODEL_NAME,
-                temperature=TEMPERATURE,
-                max_tokens=MAX_TOKENS,
-                response_format={"type": "json_object"},
-                messages=[
-                    {"role": "system", "content": SYSTEM_MSG},
-                    {"role": "user",   "content": prompt},
-                ],
-            )
+            async with semaphore:
+                resp = await aclient.chat.completions.create(**body)
+            track_usage(resp.usage)
             content = resp.choices[0].message.content
-            return json.loads(content)
+            return parse_json(content)
         except Exception as e:
             msg = str(e).lower()
             if "rate limit" in msg or "429" in msg or "please try again" in msg or "timeout" in msg:
                 sleep_s = min(BACKOFF_MAX_S, backoff * (1.5 + random.random()))
                 print(f"[WAIT] Hit API rate limit, sleeping {sleep_s:.1f}s before retry...")
-                time.sleep(sleep_s)
+                await asyncio.sleep(sleep_s)
                 backoff = sleep_s
                 continue
             else:
                 print(f"[ERROR] Non-retryable error: {e}")
                 raise
 
-def classify_utterance(text: str, ensemble_n: int = ENSEMBLE_N):
-    text = clean_text(text)
-    scores = []
-    for i in range(ensemble_n):
-        builder = PROMPT_BUILDERS[i % len(PROMPT_BUILDERS)]
-        prompt  = builder(text)
+async def call_openai(system_prompt: str, utterance: str, semaphore: asyncio.Semaphore, cache):
+    key = cache_key(system_prompt, utterance)
+    if key in cache:
+        return cache[key]
+    js = await chat_json(request_body(system_prompt, utterance), semaphore)
+    cache[key] = js
+    return js
+
+async def call_openai_multi(variant: int, utterances: list, semaphore: asyncio.Semaphore, cache) -> list:
+    """
+    Classify several utterances with one request using the variant's packed prompt.
+    Results are cached per utterance under packed keys; anything the packed reply
+    misses is retried alone with the single-utterance prompt.
+    """
+    system_prompt = SYSTEM_PROMPTS[variant % len(SYSTEM_PROMPTS)]
+    packed_prompt = PACKED_SYSTEM_PROMPTS[variant % len(PACKED_SYSTEM_PROMPTS)]
+    keys = [cache_key(packed_prompt, u, packed=True) for u in utterances]
+    out = [cache.get(k) for k in keys]
+    todo = [j for j, r in enumerate(out) if r is None]
+
+    packed = len(todo) > 1
+    if packed:
+        PACKED_USAGE["calls"] += 1
         try:
-            js = call_openai(prompt)
-            econ = clip_unit(js.get("econ", 0.0))
-            soc  = clip_unit(js.get("soc",  0.0))
-            scores.append((econ, soc))
+            js = await chat_json(multi_request_body(packed_prompt, [utterances[j] for j in todo]), semaphore)
         except Exception:
+            js = {}
+        rows = js.get("results") if isinstance(js, dict) else None
+        for r in rows if isinstance(rows, list) else []:
+            # entries without both scores are left for the single-call retry
+            try:
+                k = int(r["id"])
+                scores = {"econ": r["econ"], "soc": r["soc"]}
+            except Exception:
+                continue
+            if 0 <= k < len(todo) and out[todo[k]] is None:
+                j = todo[k]
+                out[j] = scores
+                cache[keys[j]] = out[j]
+
+    missing = [j for j in todo if out[j] is None]
+    if packed and missing:
+        PACKED_USAGE["fallback_calls"] += 1
+        PACKED_USAGE["resent"] += len(missing)
+    singles = await asyncio.gather(
+        *[call_openai(system_prompt, utterances[j], semaphore, cache) for j in missing], return_exceptions=True
+    )
+    for j, r in zip(missing, singles):
+        out[j] = r
+    return out
+
+async def classify_utterance(text: str, semaphore: asyncio.Semaphore, cache, ensemble_n: int = ENSEMBLE_N):
+    text = clean_text(text)
+    system_prompts = [SYSTEM_PROMPTS[i % len(SYSTEM_PROMPTS)] for i in range(ensemble_n)]
+    # prompt variants are independent, so send them concurrently
+    responses = await asyncio.gather(
+        *[call_openai(sp, text, semaphore, cache) for sp in system_prompts], return_exceptions=True
+    )
+    return aggregate_scores(responses)
+
+async def classify_utterances(texts: list, semaphore: asyncio.Semaphore, cache, ensemble_n: int = ENSEMBLE_N):
+    """Packed variant of classify_utterance: one request per prompt variant for the whole group."""
+    texts = [clean_text(t) for t in texts]
+    per_variant = await asyncio.gather(
+        *[call_openai_multi(v, texts, semaphore, cache) for v in range(ensemble_n)], return_exceptions=True
+    )
+    per_variant = [rs if isinstance(rs, list) else [rs] * len(texts) for rs in per_variant]
+    return [aggregate_scores(rs) for rs in zip(*per_variant)]
+
+def aggregate_scores(responses) -> dict:
+    """Average the ensemble's JSON responses; failed variants count as (0, 0)."""
+    scores = []
+    for js in responses:
+        if not isinstance(js, dict):
             scores.append((0.0, 0.0))
+            continue
+        econ = clip_unit(js.get("econ", 0.0))
+        soc  = clip_unit(js.get("soc",  0.0))
+        scores.append((econ, soc))
     econ_vals = np.array([s[0] for s in scores], dtype=float)
     soc_vals  = np.array([s[1] for s in scores], dtype=float)
     return {
@@ -189,6 +386,252 @@ def classify_utterance(text: str, ensemble_n: int = ENSEMBLE_N):
         "soc_std":  float(np.std(soc_vals,  ddof=0)),
     }
 
+SCORE_COLS = ["econ", "soc", "econ_std", "soc_std"]
+
+def assign_scores(df: pd.DataFrame, results: dict):
+    """Write {row index: aggregated scores} into the score columns in one assignment."""
+    if not results:
+        return
+    scores = pd.DataFrame.from_dict(results, orient="index")
+    df.loc[scores.index, SCORE_COLS] = scores[SCORE_COLS].to_numpy(dtype=float)
+
+# parts are keyed by the classified text, not the row label, so a regenerated
+# input never gets stale scores written onto different utterances
+CHECKPOINT_SCHEMA = pa.schema([("text_hash", pa.string())] + [(c, pa.float64()) for c in SCORE_COLS])
+
+def text_hash(text) -> str:
+    return hashlib.sha256(clean_text(text).encode("utf-8")).hexdigest()
+
+def load_checkpoint(df: pd.DataFrame, to_process_idx: list):
+    """Restore scores from previous (interrupted) runs; returns (remaining indices, number of parts)."""
+    parts = sorted(CHECKPOINT_DIR.glob("part-*.parquet"))
+    if not parts:
+        return to_process_idx, 0
+    done = pq.read_table(CHECKPOINT_DIR, schema=CHECKPOINT_SCHEMA)
+    scores = done.to_pandas().drop_duplicates("text_hash", keep="last").set_index("text_hash")
+    hashes = pd.Series([text_hash(df.at[i, "text"]) for i in to_process_idx], index=to_process_idx)
+    hashes = hashes[hashes.isin(scores.index)]
+    df.loc[hashes.index, SCORE_COLS] = scores.loc[hashes.to_numpy(), SCORE_COLS].to_numpy(dtype=float)
+    print(f"[RESUME] {len(hashes)} rows restored from {len(parts)} parts in {CHECKPOINT_DIR}")
+    done_idx = set(hashes.index)
+    return [i for i in to_process_idx if i not in done_idx], int(parts[-1].stem.split("-")[1]) + 1
+
+def write_checkpoint_part(table: pa.Table, n: int):
+    # each part is a complete file written under a hidden name (ignored by
+    # pq.read_table) and renamed into place, so a killed run never leaves a
+    # torn part and earlier parts are never reopened
+    tmp = CHECKPOINT_DIR / f".part-{n:06d}.parquet.tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, CHECKPOINT_DIR / f"part-{n:06d}.parquet")
+
+async def run_all(df: pd.DataFrame, to_process_idx: list, cache):
+    """Classify rows concurrently, writing every CHECKPOINT_EVERY rows' scores to a new checkpoint part."""
+    to_process_idx, next_part = load_checkpoint(df, to_process_idx)
+    CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def classify_group(group):
+        texts = [df.at[i, "text"] for i in group]
+        return group, await classify_utterances(texts, semaphore, cache, ENSEMBLE_N)
+
+    # every group is scheduled up front so the semaphore stays full; a checkpoint
+    # part is written whenever CHECKPOINT_EVERY more rows have completed
+    groups = [to_process_idx[g:g + UTTERANCES_PER_CALL] for g in range(0, len(to_process_idx), UTTERANCES_PER_CALL)]
+    tasks = [asyncio.ensure_future(classify_group(g)) for g in groups]
+    pbar = tqdm(total=len(to_process_idx), desc="Classifying ideology")
+    batch_results = {}
+
+    def flush():
+        nonlocal next_part
+        assign_scores(df, batch_results)
+        # only the new rows are written, so checkpoint cost stays linear in N
+        write_checkpoint_part(pa.Table.from_pylist(
+            [{"text_hash": text_hash(df.at[i, "text"]), **{c: r[c] for c in SCORE_COLS}}
+             for i, r in batch_results.items()],
+            schema=CHECKPOINT_SCHEMA,
+        ), next_part)
+        next_part += 1
+        batch_results.clear()
+        cache.sync()
+
+    try:
+        for fut in asyncio.as_completed(tasks):
+            group, group_results = await fut
+            batch_results.update(zip(group, group_results))
+            pbar.update(len(group))
+            if len(batch_results) >= CHECKPOINT_EVERY:
+                flush()
+        if batch_results:
+            flush()
+    finally:
+        pbar.close()
+        for t in tasks:
+            t.cancel()
+
+# === EMBEDDING REGRESSION ===
+
+def embed_key(text: str) -> str:
+    return "emb:" + hashlib.sha256(f"{EMBED_MODEL}|{text}".encode("utf-8")).hexdigest()
+
+async def embed_texts(texts: list, semaphore: asyncio.Semaphore, cache) -> np.ndarray:
+    """Unit-normalized embeddings for texts; vectors are cached per text, misses sent EMBED_BATCH at a time."""
+    keys = [embed_key(t) for t in texts]
+    pending = list({k: t for k, t in zip(keys, texts) if k not in cache}.items())
+
+    async def embed_batch(batch):
+        async with semaphore:
+            resp = await aclient.embeddings.create(model=EMBED_MODEL, input=[t for _, t in batch])
+        for (k, _), d in zip(batch, resp.data):
+            cache[k] = d.embedding
+
+    await asyncio.gather(*[embed_batch(pending[s:s + EMBED_BATCH]) for s in range(0, len(pending), EMBED_BATCH)])
+    X = np.array([cache[k] for k in keys], dtype=np.float32).reshape(len(keys), -1)
+    return X / np.linalg.norm(X, axis=1, keepdims=True)
+
+async def run_embeddings(df: pd.DataFrame, to_process_idx: list, cache):
+    """
+    Label a random sample via chat, fit a ridge head on embeddings (sample + EXAMPLES),
+    predict the rest. Near-duplicates of labelled utterances reuse their label and
+    predictions the bootstrap heads disagree on fall back to chat.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    texts = [clean_text(df.at[i, "text"]) for i in to_process_idx]
+    if not texts:
+        return
+    X = await embed_texts(texts, semaphore, cache)
+    X_ex = await embed_texts([ex["text"] for ex in EXAMPLES], semaphore, cache)
+
+    async def classify_many(positions):
+        out = await asyncio.gather(*[classify_utterance(texts[p], semaphore, cache) for p in positions])
+        return dict(zip(positions.tolist(), out))
+
+    # training labels: few-shot examples + chat-labelled sample
+    rng = np.random.default_rng(SEED)
+    train_pos = rng.choice(len(texts), size=min(EMBED_TRAIN_N, len(texts)), replace=False)
+    results = await classify_many(train_pos)
+    X_train = np.vstack([X_ex, X[train_pos]])
+    y_train = np.array([[ex["econ"], ex["soc"]] for ex in EXAMPLES]
+                       + [[results[p]["econ"], results[p]["soc"]] for p in train_pos.tolist()])
+    ridge = Ridge(alpha=RIDGE_ALPHA).fit(X_train, y_train)
+
+    rest = np.setdiff1d(np.arange(len(texts)), train_pos)
+    pred = np.clip(ridge.predict(X[rest]), -1.0, 1.0)
+
+    # semantic cache: reuse the label of a near-identical labelled utterance
+    sims = X[rest] @ X_train.T
+    best = sims.argmax(axis=1)
+    dup = sims[np.arange(len(rest)), best] >= SIM_THRESHOLD
+    pred[dup] = y_train[best[dup]]
+
+    # uncertainty = spread of ridge heads fit on bootstrap resamples of the training
+    # set; a near-neutral prediction is a normal answer, disagreement is not
+    boot = np.stack([
+        Ridge(alpha=RIDGE_ALPHA).fit(X_train[b], y_train[b]).predict(X[rest])
+        for b in (rng.integers(0, len(X_train), len(X_train)) for _ in range(RIDGE_HEADS))
+    ])
+    spread = np.clip(boot, -1.0, 1.0).std(axis=0).max(axis=1)
+    unsure = rest[~dup & (spread > UNSURE_STD)]
+    results.update(await classify_many(unsure))
+    print(f"[INFO] Embedding mode | chat-labelled: {len(train_pos)} train + {len(unsure)} unsure "
+          f"| ridge: {len(rest) - len(unsure) - int(dup.sum())} | reused: {int(dup.sum())}")
+
+    ridge_idx = []
+    for p, (econ, soc) in zip(rest.tolist(), pred):
+        if p not in results:
+            results[p] = {"econ": float(econ), "soc": float(soc), "econ_std": np.nan, "soc_std": np.nan}
+            ridge_idx.append(to_process_idx[p])
+
+    assign_scores(df, {to_process_idx[p]: r for p, r in results.items()})
+    df.loc[ridge_idx, "notes"] = "embedding"
+
+# === BATCH API ===
+
+def write_batch_files(requests: list) -> list:
+    """Write JSONL input files, starting a new one before the request-count or byte limit; returns their paths."""
+    paths, f, n_req, n_bytes = [], None, 0, 0
+    try:
+        for custom_id, (system_prompt, utterance) in requests:
+            line = (json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": request_body(system_prompt, utterance),
+            }) + "\n").encode("utf-8")
+            if f is None or n_req >= BATCH_MAX_REQUESTS or n_bytes + len(line) > BATCH_MAX_BYTES:
+                if f is not None:
+                    f.close()
+                paths.append(BATCH_DIR / f"ideology_batch_{len(paths)}_input.jsonl")
+                f, n_req, n_bytes = open(paths[-1], "wb"), 0, 0
+            f.write(line)
+            n_req += 1
+            n_bytes += len(line)
+    finally:
+        if f is not None:
+            f.close()
+    return paths
+
+def run_batch(df: pd.DataFrame, to_process_idx: list, cache):
+    """Submit all uncached prompts through the Batch API, wait, and fill econ/soc columns."""
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+
+    responses = {i: [None] * ENSEMBLE_N for i in to_process_idx}
+    pending, prompts = [], {}
+    for i in to_process_idx:
+        text = clean_text(df.at[i, "text"])
+        for v in range(ENSEMBLE_N):
+            prompt = (SYSTEM_PROMPTS[v % len(SYSTEM_PROMPTS)], text)
+            key = cache_key(*prompt)
+            if key in cache:
+                responses[i][v] = cache[key]
+                continue
+            custom_id = f"{i}-{v}"
+            pending.append((custom_id, prompt))
+            prompts[custom_id] = prompt
+    print(f"[BATCH] {len(pending)} requests to submit ({len(to_process_idx) * ENSEMBLE_N - len(pending)} cached)")
+
+    batches = []
+    for in_path in write_batch_files(pending):
+        with open(in_path, "rb") as f:
+            input_file = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        print(f"[BATCH] Submitted {batch.id} <- {in_path.name}")
+        batches.append(batch)
+
+    for b, batch in enumerate(batches):
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(BATCH_POLL_S)
+            batch = client.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            print(f"[BATCH] {batch.id}: {batch.status} ({counts.completed}/{counts.total} done)")
+        if batch.status != "completed" or not batch.output_file_id:
+            print(f"[ERROR] Batch {batch.id} ended with status '{batch.status}'")
+            continue
+
+        out_text = client.files.content(batch.output_file_id).text
+        out_path = BATCH_DIR / f"ideology_batch_{b}_output.jsonl"
+        out_path.write_text(out_text, encoding="utf-8")
+
+        for line in out_text.splitlines():
+            rec = parse_json(line)
+            i, v = rec["custom_id"].rsplit("-", 1)
+            resp = rec.get("response") or {}
+            if resp.get("status_code") != 200:
+                continue
+            try:
+                content = resp["body"]["choices"][0]["message"]["content"]
+                js = parse_json(content)
+            except Exception:
+                continue
+            responses[int(i)][int(v)] = js
+            cache[cache_key(*prompts[rec["custom_id"]])] = js
+
+    assign_scores(df, {i: aggregate_scores(rs) for i, rs in responses.items()})
+
 # === MAIN ===
 
 def main():
@@ -202,33 +645,37 @@ def main():
         if col not in df.columns:
             df[col] = np.nan
 
-    to_process_idx = []
-    for i, row in df.iterrows():
-        text = clean_text(row.get("text", ""))
-        if SKIP_MODERATORS and is_moderator(row):
-            df.at[i, "notes"] = "moderator"
-            continue
-        if too_short(text):
-            df.at[i, "notes"] = "too_short"
-            continue
-        if pd.isna(row.get("rhetoric_label")):
-            df.at[i, "notes"] = "missing_rhetoric"
-            continue
-        to_process_idx.append(i)
+    # skip reasons, vectorized over the whole frame (first matching reason wins)
+    texts = df["text"] if "text" in df.columns else pd.Series("", index=df.index)
+    speakers = df["speaker"] if "speaker" in df.columns else pd.Series("", index=df.index)
+    moderator = speakers.map(is_moderator) if SKIP_MODERATORS else pd.Series(False, index=df.index)
+    short = texts.map(clean_text).map(too_short) & ~moderator
+    if "rhetoric_label" in df.columns:
+        missing = df["rhetoric_label"].isna() & ~moderator & ~short
+    else:
+        missing = ~moderator & ~short
+    df.loc[moderator, "notes"] = "moderator"
+    df.loc[short, "notes"] = "too_short"
+    df.loc[missing, "notes"] = "missing_rhetoric"
+    to_process_idx = df.index[~(moderator | short | missing)].tolist()
 
     print(f"[INFO] Total rows: {len(df)} | To classify: {len(to_process_idx)} | Skipped: {len(df)-len(to_process_idx)}")
 
-    for n, i in enumerate(tqdm(to_process_idx, desc="Classifying ideology")):
-        text = df.at[i, "text"]
-        results = classify_utterance(text, ENSEMBLE_N)
-        df.at[i, "econ"]     = results["econ"]
-        df.at[i, "soc"]      = results["soc"]
-        df.at[i, "econ_std"] = results["econ_std"]
-        df.at[i, "soc_std"]  = results["soc_std"]
-        if (n + 1) % CHECKPOINT_EVERY == 0:
-            tmp_path = OUTPUT_FILE.with_suffix(".checkpoint.csv")
-            df.to_csv(tmp_path, index=False)
-            print(f"[CHECKPOINT] Saved -> {tmp_path}")
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with shelve.open(str(CACHE_FILE)) as cache:
+        if USE_BATCH_API:
+            run_batch(df, to_process_idx, cache)
+        else:
+            if USE_EMBEDDINGS:
+                asyncio.run(run_embeddings(df, to_process_idx, cache))
+            else:
+                asyncio.run(run_all(df, to_process_idx, cache))
+            if TOKEN_USAGE["prompt"]:
+                share = TOKEN_USAGE["cached"] / TOKEN_USAGE["prompt"]
+                print(f"[INFO] Prompt tokens: {TOKEN_USAGE['prompt']:,} | cached: {TOKEN_USAGE['cached']:,} ({share:.0%})")
+            if PACKED_USAGE["calls"]:
+                print(f"[INFO] Packed requests: {PACKED_USAGE['calls']:,} | fell back to single calls: "
+                      f"{PACKED_USAGE['fallback_calls']:,} ({PACKED_USAGE['resent']:,} utterances resent)")
 
     cols_keep = ["utterance_id", "debate_id", "year", "speaker", "party", "text",
                  "rhetoric_label", "econ", "soc", "econ_std", "soc_std", "notes"]
@@ -238,6 +685,7 @@ def main():
     OUTPUT_FILE.parent.mkdir(parents=True, exist_ok=True)
     df_slim.to_csv(OUTPUT_FILE, index=False)
     print(f"[DONE] Saved ideology annotations -> {OUTPUT_FILE}")
+    shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)  # scores are in the final output now
 
     avail = df_slim.dropna(subset=["econ", "soc"])
     if "party" in avail.columns:
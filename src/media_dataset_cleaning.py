@@ -1,8 +1,14 @@
 from pathlib import Path
+import os
 import re
 import argparse
+import multiprocessing as mp
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from csv_io import iter_csv_arrow
 
 
 # === PATH CONFIG ===
@@ -19,6 +25,29 @@ TAG_TOKENS = {
 }
 TAIL_TAGS = {"NS","RE","IPC","IPD","PUB","AN","ART","SE"}
 
+# column types for media_articles_split.csv (skips dtype inference on load)
+INPUT_COLUMN_TYPES = {
+    "text": pa.string(),
+    "year": pa.int16(),
+    "theme": pa.string(),
+    "outlet": pa.string(),
+    "article_number": pa.int32(),
+    "source_file": pa.string(),
+}
+
+# output schema (lets every streamed chunk append to the same Parquet file)
+OUTPUT_SCHEMA = pa.schema([
+    ("year", pa.int16()), ("theme", pa.string()), ("outlet", pa.string()),
+    ("outlet_leaning", pa.string()), ("article_number", pa.int32()),
+    ("headline", pa.string()), ("body", pa.string()),
+    ("has_td", pa.bool_()), ("has_lp", pa.bool_()),
+    ("source_file", pa.string()),
+    ("body_words", pa.int64()), ("body_len", pa.int64()), ("headline_len", pa.int64()),
+])
+OUTPUT_COLS = OUTPUT_SCHEMA.names
+
+CHUNK_BYTES = 8 << 20   # CSV bytes per streamed chunk (~thousands of articles)
+
 # tail phrases that often mark the end (we hard-cut if they appear)
 TAIL_PHRASES = [
     "Dow Jones & Company, Inc.",
@@ -34,40 +63,33 @@ OUTLET_LEANING = {
 }
 
 
-# === HELPERS ===
-# simple cache for tag line presence checks
-TAG_LINE_CACHE = {}
+# generic footer noise to strip from body lines
+DROP_LINE_PATTERNS = [
+    r"^Appeared in the .* print edition.*",  # WSJ print footer
+    r"^Write to .+@wsj\.com$",
+    r"^Copyright \d{4} .* All Rights Reserved\.$",
+    r"^\(c\)\s*\d{4}.*All rights reserved\.$",
+    r"^All Rights Reserved\.$",
+    r"^.*This material may not be published.*$",
+    r"^.*Distributed by.*$",
+]
 
-def has_tag_line(chunk: str, tag: str) -> bool:
-    """Return True if a line that is exactly the tag exists anywhere in chunk."""
-    key = (id(chunk), tag)
-    # id(chunk) only helps per-run caching; safe to compute each time too
-    pattern = rf"(?m)^\s*{re.escape(tag)}\s*$"
-    return re.search(pattern, chunk) is not None
 
-def _is_tag_line(s: str) -> bool:
-    return s.strip() in TAG_TOKENS
+# === COMPILED REGEXES ===
+# compiled once at import instead of per row
+DROP_LINE_RE    = re.compile("|".join(f"(?:{p})" for p in DROP_LINE_PATTERNS))
+FACTIVA_IDX_RE  = re.compile(r"^[a-z]{2,5}\s*:\s*", re.I)   # index codes like "gdip : ..."
+MULTI_NL_RE     = re.compile(r"\n{3,}")
+HSPACE_RE       = re.compile(r"[ \t]+")
 
 
-def _extract_block(chunk: str, start_tag: str, end_tags: set) -> str:
+# === HELPERS ===
+def _finish_body(block: list) -> str:
     """
-    Return text between start_tag and the first line that is a tail tag (end_tags).
-    Also hard-cut on TAIL_PHRASES if they appear in the block.
+    Turn the raw lines of a TD/LP block into body text: hard-cut on TAIL_PHRASES,
+    drop tag-only / footer / index-code lines, then normalize whitespace.
     """
-    lines = chunk.splitlines()
-    out, started = [], False
-    for ln in lines:
-        s = ln.strip()
-        if not started:
-            if s == start_tag:
-                started = True
-            continue
-        # inside block:
-        if s in end_tags:  # hit a tail tag like NS/RE/...
-            break
-        out.append(ln)
-
-    text = "\n".join(out).strip()
+    text = "\n".join(block).strip()
 
     # hard cutoff at known phrases if present
     cut_positions = [text.find(p) for p in TAIL_PHRASES if p in text]
@@ -76,122 +98,110 @@ def _extract_block(chunk: str, start_tag: str, end_tags: set) -> str:
         if tcut > 0:
             text = text[:tcut].rstrip()
 
-    # drop any tag-only lines that slipped in
-    text = "\n".join([ln for ln in text.splitlines() if not _is_tag_line(ln)]).strip()
-
-    # collapse excessive blank lines
-    text = re.sub(r"\n{3,}", "\n\n", text).strip()
-    return text
-
-
-def extract_headline(chunk: str, fallback: str = "") -> str:
-    """
-    Headline = lines after 'HD' and before 'BY' (preferred),
-               else stop at first tag line.
-    """
-    lines = chunk.splitlines()
-    col, seen_hd = [], False
-    for ln in lines:
-        s = ln.strip()
-        if not seen_hd:
-            if s == "HD":
-                seen_hd = True
-            continue
-        if s == "BY" or _is_tag_line(s):
-            break
-        col.append(ln)
-
-    headline = " ".join([c.strip() for c in col if c.strip()]) or fallback
-    # normalize whitespace in headline
-    headline = re.sub(r"\s+", " ", headline).strip()
-    return headline
-
-
-def extract_body(chunk: str, outlet: str = "") -> str:
-    """
-    Prefer TD…tail. If no TD exists, fall back to LP…tail.
-    Then run outlet-specific cleanup for footer lines.
-    """
-    # robust tag presence (anywhere, full line)
-    has_td = has_tag_line(chunk, "TD")
-    has_lp = has_tag_line(chunk, "LP")
-
-    if has_td:
-        body = _extract_block(chunk, "TD", TAIL_TAGS)
-    elif has_lp:
-        body = _extract_block(chunk, "LP", TAIL_TAGS)
-    else:
-        return ""  # no TD/LP → no body
-
-    # generic footer noise to strip from body lines
-    drop_line_patterns = [
-        r"^Appeared in the .* print edition.*",  # WSJ print footer
-        r"^Write to .+@wsj\.com$",
-        r"^Copyright \d{4} .* All Rights Reserved\.$",
-        r"^\(c\)\s*\d{4}.*All rights reserved\.$",
-        r"^All Rights Reserved\.$",
-        r"^.*This material may not be published.*$",
-        r"^.*Distributed by.*$",
-    ]
-    compiled = [re.compile(pat) for pat in drop_line_patterns]
-
     cleaned_lines = []
-    for ln in body.splitlines():
+    for ln in text.splitlines():
         s = ln.strip()
-        if s in TAG_TOKENS:
+        if s in TAG_TOKENS:  # tag-only lines that slipped in
             continue
-        if any(rgx.match(s) for rgx in compiled):
+        if DROP_LINE_RE.match(s):
             continue
         # drop straggler factiva index codes like "gdip : ..." "usa : ..." etc.
-        if ":" in s and len(s) < 120 and re.match(r"^[a-z]{2,5}\s*:\s*", s, flags=re.I):
+        if ":" in s and len(s) < 120 and FACTIVA_IDX_RE.match(s):
             continue
         cleaned_lines.append(ln)
 
     body = "\n".join(cleaned_lines).strip()
 
     # normalize whitespace
-    body = re.sub(r"[ \t]+", " ", body)
-    body = re.sub(r"\n{3,}", "\n\n", body).strip()
-
+    body = HSPACE_RE.sub(" ", body)
+    body = MULTI_NL_RE.sub("\n\n", body).strip()
     return body
 
 
-# === PIPELINE ===
-def main(input_csv: Path, output_csv: Path, preview_n: int = 5):
-    print(f"[INFO] Reading split articles from: {input_csv}")
-    df = pd.read_csv(input_csv)
+# block states while scanning a chunk
+_WAIT, _OPEN, _DONE = 0, 1, 2
+
+def parse_chunk(chunk: str) -> dict:
+    """
+    Single pass over an article's lines → headline, body, has_td, has_lp.
 
-    required_cols = {"text", "year", "theme", "outlet", "article_number", "source_file"}
-    missing = required_cols - set(df.columns)
-    if missing:
-        raise ValueError(f"Missing required columns in input CSV: {missing}")
+    Headline = lines after the first 'HD' up to the next tag line ('BY' preferred).
+    Body     = lines after the first 'TD' up to the first tail tag; if there is
+               no TD, the same for 'LP'. The HD/TD/LP blocks may overlap, so
+               each keeps its own state instead of sharing one.
+    """
+    hd, td, lp = _WAIT, _WAIT, _WAIT
+    headline_lines, td_lines, lp_lines = [], [], []
 
-    print(f"[INFO] Rows in: {len(df):,}")
-    print("[STEP] Extracting headline & body …")
+    for ln in chunk.splitlines():
+        s = ln.strip()
+        is_tag = s in TAG_TOKENS
+
+        # collect into open blocks (the opening tag line itself is skipped below)
+        if hd == _OPEN:
+            if is_tag:
+                hd = _DONE
+            else:
+                headline_lines.append(ln)
+        if td == _OPEN:
+            if s in TAIL_TAGS:
+                td = _DONE
+            else:
+                td_lines.append(ln)
+        if lp == _OPEN:
+            if s in TAIL_TAGS:
+                lp = _DONE
+            else:
+                lp_lines.append(ln)
+
+        if is_tag:
+            if s == "HD" and hd == _WAIT:
+                hd = _OPEN
+            elif s == "TD" and td == _WAIT:
+                td = _OPEN
+            elif s == "LP" and lp == _WAIT:
+                lp = _OPEN
+
+        # nothing left to learn from the rest of the chunk
+        if hd == _DONE and td == _DONE and lp != _WAIT:
+            break
 
+    has_td, has_lp = td != _WAIT, lp != _WAIT
+    if has_td:
+        body = _finish_body(td_lines)
+    elif has_lp:
+        body = _finish_body(lp_lines)
+    else:
+        body = ""  # no TD/LP → no body
+
+    return {
+        "headline": " ".join(" ".join(headline_lines).split()),
+        "body": body,
+        "has_td": has_td,   # flags (for diagnostics only)
+        "has_lp": has_lp,
+    }
+
+
+def process_article(text):
+    """Worker: article text -> (headline, body, has_td, has_lp) for one article."""
+    chunk = "" if pd.isna(text) else str(text)
+    parsed = parse_chunk(chunk)
+    return parsed["headline"], parsed["body"], parsed["has_td"], parsed["has_lp"]
+
+
+def clean_chunk(df: pd.DataFrame, pool) -> pd.DataFrame:
+    """Add headline/body/flags and QC columns to one chunk of split articles."""
     headlines = []
     bodies = []
     td_flags = []
     lp_flags = []
 
-    for i, row in df.iterrows():
-        chunk   = str(row["text"] or "")
-        outlet  = str(row["outlet"]).lower().strip()
-
-        # flags (for diagnostics only)
-        has_td = has_tag_line(chunk, "TD")
-        has_lp = has_tag_line(chunk, "LP")
-        td_flags.append(has_td)
-        lp_flags.append(has_lp)
-
-        headline = extract_headline(chunk, fallback="")
-        body     = extract_body(chunk, outlet=outlet)
-
+    # articles are independent → spread across processes (ordered results)
+    for headline, body, has_td, has_lp in pool.imap(process_article, df["text"].tolist(), chunksize=64):
         headlines.append(headline)
         bodies.append(body)
-
-        if (i+1) % 200 == 0 or i == len(df)-1:
-            print(f"  [..] processed {i+1:,}/{len(df):,}")
+        td_flags.append(has_td)
+        lp_flags.append(has_lp)
 
     df["headline"] = headlines
     df["body"]     = bodies
@@ -206,42 +216,78 @@ def main(input_csv: Path, output_csv: Path, preview_n: int = 5):
     df["headline_len"] = df["headline"].fillna("").str.len()
     df["body_len"]     = df["body"].fillna("").str.len()
     df["body_words"]   = df["body"].fillna("").str.split().map(len)
+    return df
+
+
+# === PIPELINE ===
+def main(input_csv: Path, output_csv: Path, preview_n: int = 5, workers: int = None, parquet: bool = False):
+    print(f"[INFO] Streaming split articles from: {input_csv}")
+    workers = workers or os.cpu_count()
+    print(f"[STEP] Extracting headline & body … ({workers} workers)")
+
+    output_csv.parent.mkdir(parents=True, exist_ok=True)
+    pq_path = output_csv.with_suffix(".parquet")
+    pq_writer = None
+
+    n_in, n_out = 0, 0
+    body_lens, body_words = [], []   # small int series kept for the QC summary
+    previews = []
+
+    with mp.Pool(processes=workers) as pool:
+        for k, df in enumerate(iter_csv_arrow(input_csv, INPUT_COLUMN_TYPES, CHUNK_BYTES)):
+            if k == 0:
+                required_cols = {"text", "year", "theme", "outlet", "article_number", "source_file"}
+                missing = required_cols - set(df.columns)
+                if missing:
+                    raise ValueError(f"Missing required columns in input CSV: {missing}")
+
+            df = clean_chunk(df, pool)
+            n_in += len(df)
+            body_lens.append(df["body_len"])
+            body_words.append(df["body_words"])
+
+            # drop rows with empty body (rare but safer)
+            df = df[df["body"].str.strip().str.len() > 0]
+
+            # final column order (minimal + useful diagnostics); absent columns → NaN
+            df_out = df.reindex(columns=OUTPUT_COLS)
+
+            # append chunk to outputs
+            df_out.to_csv(output_csv, mode="w" if k == 0 else "a", header=(k == 0), index=False)
+            if parquet:
+                if pq_writer is None:
+                    pq_writer = pq.ParquetWriter(pq_path, OUTPUT_SCHEMA, compression="zstd")
+                pq_writer.write_table(pa.Table.from_pandas(df_out, schema=OUTPUT_SCHEMA, preserve_index=False))
+
+            n_out += len(df_out)
+            if sum(len(p) for p in previews) < preview_n:
+                previews.append(df_out.head(preview_n))
+            print(f"  [..] processed {n_in:,} rows")
+
+    if pq_writer is not None:
+        pq_writer.close()
+
+    print(f"[INFO] Rows in: {n_in:,}")
+    if n_in == 0:
+        print("[WARN] No rows found in input.")
+        return
 
     print("\n[QC] Body length stats (chars):")
-    print(df["body_len"].describe())
+    print(pd.concat(body_lens, ignore_index=True).describe())
     print("\n[QC] Body word count stats:")
-    print(df["body_words"].describe())
-
-    # drop rows with empty body (rare but safer)
-    before = len(df)
-    df = df[df["body"].str.strip().str.len() > 0].copy()
-    after = len(df)
-    if after < before:
-        print(f"[CLEAN] Dropped {before-after} rows with empty body.")
-
-    # final column order (minimal + useful diagnostics)
-    cols = [
-        "year", "theme", "outlet", "outlet_leaning", "article_number",
-        "headline", "body",
-        "has_td", "has_lp",
-        "source_file",
-        "body_words", "body_len", "headline_len"
-    ]
-    for c in cols:
-        if c not in df.columns:
-            df[c] = np.nan
-
-    df_out = df[cols].copy()
-
-    # save
-    output_csv.parent.mkdir(parents=True, exist_ok=True)
-    df_out.to_csv(output_csv, index=False)
-    print(f"\n[SAVED] {len(df_out):,} cleaned rows → {output_csv}")
+    print(pd.concat(body_words, ignore_index=True).describe())
+
+    if n_out < n_in:
+        print(f"[CLEAN] Dropped {n_in-n_out} rows with empty body.")
+
+    print(f"\n[SAVED] {n_out:,} cleaned rows → {output_csv}")
+    if parquet:
+        print(f"[SAVED] Parquet copy → {pq_path}")
 
     # preview
     print("\n[PREVIEW] Sample rows:")
     with pd.option_context("display.max_colwidth", 120):
-        print(df_out.head(preview_n))
+        print(pd.concat(previews).head(preview_n) if previews else "(none)")
 
 
 # === ENTRY POINT ===
@@ -250,6 +296,8 @@ if __name__ == "__main__":
     parser.add_argument("--input",  type=str, default=str(INPUT_CSV_DEFAULT),  help="Path to media_articles_split.csv")
     parser.add_argument("--output", type=str, default=str(OUTPUT_CSV_DEFAULT), help="Path to save cleaned CSV")
     parser.add_argument("--preview", type=int, default=5, help="Number of preview rows to print")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes for text cleaning")
+    parser.add_argument("--parquet", action="store_true", help="Also write a zstd Parquet copy next to the CSV")
     args = parser.parse_args()
 
     in_csv  = Path(args.input)
@@ -264,4 +312,4 @@ if __name__ == "__main__":
     if not in_csv.exists():
         raise FileNotFoundError(f"Input CSV not found: {in_csv}")
 
-    main(in_csv, out_csv, preview_n=args.preview)
\ No newline at end of file
+    main(in_csv, out_csv, preview_n=args.preview, workers=args.workers, parquet=args.parquet)
\ No newline at end of file
@@ -1,7 +1,13 @@
 from pathlib import Path
+import os
 import re
-import hashlib
+import multiprocessing as mp
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xxhash
+
+from csv_io import iter_csv_arrow
 
 # === CONFIG ===
 REPO_DIR  = Path(".").resolve().parents[0]
@@ -13,6 +19,22 @@ OUTPUT_CSV = DATA_DIR / "media_articles_dataset.csv"
 
 MIN_WORDS = 100                  # drop bodies with fewer words than this
 NORMALIZE_NYP_NS = True          # remove 'ns' bullets at line starts for NYP
+WORKERS = os.cpu_count()         # processes for per-article cleaning
+WRITE_PARQUET = False            # also save a zstd Parquet copy next to OUTPUT_CSV
+CHUNK_BYTES = 8 << 20            # CSV bytes per streamed chunk (~thousands of articles)
+
+# the columns this script reads or carries through, with their types; only these are
+# parsed (absent ones are skipped), so flags and length columns are never read
+INPUT_COLUMN_TYPES = {
+    "year": pa.int16(),
+    "theme": pa.string(),
+    "outlet": pa.string(),
+    "outlet_leaning": pa.string(),
+    "article_number": pa.int32(),
+    "headline": pa.string(),
+    "body": pa.string(),
+    "source_file": pa.string(),
+}
 
 # lines that are clearly boilerplate/metadataE
 # each pattern is matched
@@ -41,11 +63,19 @@ TAIL_TRIM_PATTERNS = [
     r"(?s)(.*?)\n+Subscribe to WSJ.*\s*$",
 ]
 
+# compiled once at import: line patterns unioned into one alternation so each
+# line is matched against a single regex
+BOILERPLATE_RE     = re.compile("|".join(f"(?:{p})" for p in BOILERPLATE_LINE_PATTERNS))
+TAIL_TRIM_COMPILED = [re.compile(p) for p in TAIL_TRIM_PATTERNS]
+NYP_BULLET_RE      = re.compile(r"(?m)^\s*ns\s*(?=\S)")
+WORD_RE            = re.compile(r"\w+")   # same tokens as \b\w+\b, without the boundary checks
+
 # === HELPERS ===
-def hash_body(text: str) -> str:
-    """Stable fingerprint for deduping."""
-    norm = re.sub(r"\s+", " ", (text or "")).strip().lower()
-    return hashlib.md5(norm.encode("utf-8")).hexdigest()
+def hash_body(text: str) -> int:
+    """Stable 64-bit fingerprint for deduping (non-cryptographic; exact-duplicate detection only)."""
+    # split()/join collapses whitespace in C (same Unicode whitespace set as \s)
+    norm = " ".join(text.split()).lower() if isinstance(text, str) else ""
+    return xxhash.xxh3_64_intdigest(norm.encode("utf-8"))
 
 def strip_boilerplate_lines(text: str) -> str:
     """Remove lines that are obviously boilerplate metadata."""
@@ -53,20 +83,19 @@ def strip_boilerplate_lines(text: str) -> str:
         return text
     lines = text.splitlines()
     cleaned = []
-    patterns = [re.compile(p) for p in BOILERPLATE_LINE_PATTERNS]
     for ln in lines:
         line = ln.strip()
         if not line:
             cleaned.append(ln)
             continue
-        if any(p.match(line) for p in patterns):
+        if BOILERPLATE_RE.match(line):
             continue  # drop this line
         cleaned.append(ln)
     t = "\n".join(cleaned)
 
     # optional tail trimming
-    for pat in TAIL_TRIM_PATTERNS:
-        m = re.match(pat, t)
+    for pat in TAIL_TRIM_COMPILED:
+        m = pat.match(t)
         if m:
             t = m.group(1).rstrip()
 
@@ -79,12 +108,20 @@ def normalize_nyp_bullets(text: str) -> str:
     """
     if not NORMALIZE_NYP_NS or not isinstance(text, str):
         return text
-    return re.sub(r"(?m)^\s*ns\s*(?=\S)", "", text)
+    return NYP_BULLET_RE.sub("", text)
 
 def word_count(text: str) -> int:
     if not isinstance(text, str):
         return 0
-    return len(re.findall(r"\b\w+\b", text))
+    return len(WORD_RE.findall(text))
+
+def clean_body(item):
+    """Worker: (body, outlet) -> (word count before, cleaned body, word count after) for one article."""
+    body, outlet = item
+    txt = strip_boilerplate_lines(body)
+    if str(outlet).lower() == "nyp":
+        txt = normalize_nyp_bullets(txt)
+    return word_count(body), txt, word_count(txt)
 
 # === MAIN ===
 def main():
@@ -97,71 +134,106 @@ def main():
     if not INPUT_CSV.exists():
         raise FileNotFoundError(f"Input not found: {INPUT_CSV}")
 
-    print(f"[INFO] Reading: {INPUT_CSV}")
-    df = pd.read_csv(INPUT_CSV)
-    n0 = len(df)
-    print(f"[INFO] Rows in: {n0:,}")
-
-    required = ["body", "year", "theme", "outlet"]
-    missing = [c for c in required if c not in df.columns]
-    if missing:
-        raise ValueError(f"Missing required columns: {missing}")
-
-    # initial stats
-    df["body_words"] = df["body"].apply(word_count)
-    print("\n[QC] Initial body word stats:")
-    print(df["body_words"].describe())
+    print(f"[INFO] Streaming: {INPUT_CSV}")
+    print(f"[STEP] Trimming boilerplate lines + optional NYP bullet normalization … ({WORKERS} workers)")
 
-    # clean first (boilerplate + NYP bullets)
-    print("\n[STEP] Trimming boilerplate lines + optional NYP bullet normalization …")
-    def _clean_body(row):
-        txt = strip_boilerplate_lines(row["body"])
-        if str(row.get("outlet", "")).lower() == "nyp":
-            txt = normalize_nyp_bullets(txt)
-        return txt
+    keep_cols = None
+    pq_path = OUTPUT_CSV.with_suffix(".parquet")
+    pq_writer = None
+    OUTPUT_CSV.parent.mkdir(parents=True, exist_ok=True)
 
-    df["body"] = df.apply(_clean_body, axis=1)
+    seen = set()          # 64-bit fingerprints of bodies already kept
+    n_in = n_dup = n_short = n_out = 0
+    words_in, words_out, summary_parts = [], [], []
+
+    with mp.Pool(processes=WORKERS) as pool:
+        for k, df in enumerate(iter_csv_arrow(INPUT_CSV, INPUT_COLUMN_TYPES, CHUNK_BYTES)):
+            if k == 0:
+                required = ["body", "year", "theme", "outlet"]
+                missing = [c for c in required if c not in df.columns]
+                if missing:
+                    raise ValueError(f"Missing required columns: {missing}")
+                keep_cols = [c for c in [
+                    "year", "theme", "outlet", "outlet_leaning",
+                    "article_number", "headline", "body", "source_file"
+                ] if c in df.columns] + ["body_words", "body_len"]
+
+            n_in += len(df)
+
+            # clean first (boilerplate + NYP bullets); initial and final word counts come
+            # back from the same pass, so each body crosses to the workers once
+            items = zip(df["body"].tolist(), df["outlet"].tolist())
+            cleaned = pool.map(clean_body, items, chunksize=64)
+
+            words_in.append(pd.Series([n_before for n_before, _, _ in cleaned]))
+            df["body"]       = [txt for _, txt, _ in cleaned]
+            df["body_words"] = [n for _, _, n in cleaned]
+            df["body_len"]   = df["body"].apply(lambda t: len(t) if isinstance(t, str) else 0)
+            if "headline" in df.columns:
+                df["headline_len"] = df["headline"].apply(lambda t: len(str(t)) if pd.notnull(t) else 0)
+
+            # deduplicate on cleaned body, across chunks, keeping the first occurrence
+            keep = []
+            for fp in (hash_body(t) for t in df["body"]):
+                keep.append(fp not in seen)
+                seen.add(fp)
+            before = len(df)
+            df = df.loc[keep]
+            n_dup += before - len(df)
+
+            # drop short articles after cleaning
+            before = len(df)
+            df = df[df["body_words"] >= MIN_WORDS]
+            n_short += before - len(df)
+
+            df_final = df[keep_cols]
+            df_final.to_csv(OUTPUT_CSV, mode="w" if k == 0 else "a", header=(k == 0), index=False)
+            if WRITE_PARQUET:
+                table = pa.Table.from_pandas(df_final, preserve_index=False)
+                if pq_writer is None:
+                    schema = pa.schema([
+                        (c, INPUT_COLUMN_TYPES.get(c, table.schema.field(c).type)) for c in keep_cols
+                    ])
+                    pq_writer = pq.ParquetWriter(pq_path, schema, compression="zstd")
+                pq_writer.write_table(table.cast(pq_writer.schema))
+
+            n_out += len(df_final)
+            words_out.append(df_final["body_words"])
+            summary_parts.append(df_final.groupby(["year", "theme", "outlet"]).size())
+            print(f"  [..] processed {n_in:,} rows")
+
+    if pq_writer is not None:
+        pq_writer.close()
+
+    print(f"[INFO] Rows in: {n_in:,}")
+    if n_in == 0:
+        print("[WARN] No rows found in input.")
+        return
 
-    # recompute after cleaning
-    df["body_words"] = df["body"].apply(word_count)
-    df["body_len"]   = df["body"].apply(lambda t: len(t) if isinstance(t, str) else 0)
-    if "headline" in df.columns:
-        df["headline_len"] = df["headline"].apply(lambda t: len(str(t)) if pd.notnull(t) else 0)
+    print("\n[QC] Initial body word stats:")
+    print(pd.concat(words_in, ignore_index=True).describe())
 
-    # deduplicate on cleaned body
     print("\n[STEP] Dropping exact duplicate bodies …")
-    df["body_fp"] = df["body"].apply(hash_body)
-    before = len(df)
-    df = df.drop_duplicates(subset=["body_fp"], keep="first").reset_index(drop=True)
-    print(f"  [OK] Dropped {before - len(df)} duplicate rows")
+    print(f"  [OK] Dropped {n_dup} duplicate rows")
 
-    # drop short articles after cleaning
     print(f"\n[STEP] Dropping very short bodies (< {MIN_WORDS} words) …")
-    before = len(df)
-    df = df[df["body_words"] >= MIN_WORDS].reset_index(drop=True)
-    print(f"  [OK] Dropped {before - len(df)} short rows")
+    print(f"  [OK] Dropped {n_short} short rows")
 
     print("\n[QC] Post-clean body word stats:")
-    print(df["body_words"].describe())
-
-    # final save
-    keep_cols = [c for c in [
-        "year", "theme", "outlet", "outlet_leaning",
-        "article_number", "headline", "body", "source_file"
-    ] if c in df.columns] + ["body_words", "body_len"]
+    print(pd.concat(words_out, ignore_index=True).describe())
 
-    df_final = df[keep_cols].copy()
-
-    OUTPUT_CSV.parent.mkdir(parents=True, exist_ok=True)
-    df_final.to_csv(OUTPUT_CSV, index=False)
-    print(f"\n[SAVED] {len(df_final):,} rows → {OUTPUT_CSV}")
+    print(f"\n[SAVED] {n_out:,} rows → {OUTPUT_CSV}")
+    if WRITE_PARQUET:
+        print(f"[SAVED] Parquet copy → {pq_path}")
 
     print("\n[SUMMARY] Counts by year/theme/outlet after cleaning:")
     try:
         summary = (
-            df_final.groupby(["year", "theme", "outlet"])
-                    .size().reset_index(name="n")
-                    .sort_values(["year", "theme", "outlet"])
+            pd.concat(summary_parts)
+              .groupby(level=[0, 1, 2]).sum()
+              .rename_axis(["year", "theme", "outlet"])
+              .reset_index(name="n")
+              .sort_values(["year", "theme", "outlet"])
         )
         print(summary.to_string(index=False))
     except Exception as e:
@@ -1,4 +1,6 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 from pathlib import Path
 from tqdm import tqdm
 import numpy as np
@@ -10,45 +12,74 @@ CLEANED_DIR = DATA_DIR / "processed_clean"
 METADATA_FILE = DATA_DIR / "debates_metadata.csv"
 OUTPUT_FILE = DATA_DIR / "initial_debates_dataset.csv"
 
+# only these columns of each *_utterances.csv are kept; typing them up front
+# skips pyarrow's type inference and keeps every file's schema identical
+UTTERANCE_COLUMN_TYPES = {"text": pa.string(), "speaker_normalized": pa.string()}
+
+def read_utterances(path):
+    table = pacsv.read_csv(
+        path,
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types=UTTERANCE_COLUMN_TYPES,
+            include_columns=list(UTTERANCE_COLUMN_TYPES),
+        ),
+    )
+    return table
+
 # === LOAD METADATA === #
 metadata = pd.read_csv(METADATA_FILE)
 metadata.columns = metadata.columns.str.strip()
 metadata["filename"] = metadata["filename"].str.replace(".txt", "", regex=False)
+# one row per debate_id (first match wins, as with the old boolean-mask lookup)
+metadata = metadata.drop_duplicates("filename").reset_index(drop=True)
+KNOWN_DEBATES = set(metadata["filename"])
+
+def meta_str(meta, key):
+    """Column as stripped strings (NaN → "nan", as str() gave); "" if the column is absent."""
+    if key not in meta.columns:
+        return pd.Series("", index=meta.index)
+    return meta[key].map(str).str.strip()
+
+def constant_column(value, n, type_=pa.string()):
+    return pa.array([value] * n, type=type_, from_pandas=True)
 
 # === SPEAKER & PARTY INFERENCE === #
-def get_speaker_and_party(norm_speaker, meta_row):
-    role_map = {
-        "Candidate_R": ("candidate_R", "Republican"),
-        "Candidate_D": ("candidate_D", "Democrat"),
-        "Candidate_I": ("candidate_I", "Independent"),
-        "Moderator":   (None, np.nan)
-    }
-
-    role = str(norm_speaker).strip()
-    if role in role_map:
-        meta_key, party = role_map[role]
-        if meta_key:
-            name = str(meta_row.get(meta_key, "")).strip()
-            return name, party
-        else:
-            return "Moderator", np.nan
-    else:
-        return "", ""
+ROLE_MAP = {
+    "Candidate_R": ("candidate_R", "Republican"),
+    "Candidate_D": ("candidate_D", "Democrat"),
+    "Candidate_I": ("candidate_I", "Independent"),
+    "Moderator":   (None, np.nan)
+}
+
+def get_speaker_and_party(norm_speakers, names):
+    # names: the debate's candidate_R/D/I names joined onto every utterance
+    roles = norm_speakers.astype(str).str.strip()
+    speakers = np.select(
+        [roles == role for role in ROLE_MAP],
+        [names[meta_key] if meta_key else "Moderator" for meta_key, _ in ROLE_MAP.values()],
+        default="",  # unknown roles → ("", "")
+    )
+    party_table = {role: party for role, (_, party) in ROLE_MAP.items()}
+    parties = roles.map(party_table).where(roles.isin(ROLE_MAP.keys()), "")
+    return speakers, parties
 
 # === WINNER PARTY INFERENCE === #
-def get_winner_party(meta_row):
-    winner_name = str(meta_row.get("winner", "")).strip().lower()
-
+def get_winner_party(meta):
+    # whole metadata table at once; the first candidate (R, D, I) whose name
+    # contains the winner's name decides the party
+    winner = meta_str(meta, "winner").str.lower()
+    conditions, parties = [], []
     for role_key, party in {
         "candidate_R": "Republican",
         "candidate_D": "Democrat",
         "candidate_I": "Independent"
     }.items():
-        candidate_name = str(meta_row.get(role_key, "")).strip().lower()
-        if candidate_name and winner_name in candidate_name:
-            return party
-
-    return ""
+        candidate = meta_str(meta, role_key).str.lower()
+        contains = np.fromiter((w in c for w, c in zip(winner, candidate)), dtype=bool, count=len(meta))
+        conditions.append((candidate != "").to_numpy() & contains)
+        parties.append(party)
+    return pd.Series(np.select(conditions, parties, default=""), index=meta.index)
 
 # === COMBINE ALL CLEANED FILES === #
 print("🚀 Creating final combined dataset...")
@@ -58,42 +89,36 @@ cleaned_files = sorted(CLEANED_DIR.glob("*_utterances.csv"))
 
 for file in tqdm(cleaned_files, desc="Merging files", ncols=100):
     debate_id = file.stem.replace("_utterances", "")
-    meta_row = metadata[metadata["filename"] == debate_id]
 
-    if meta_row.empty:
+    if debate_id not in KNOWN_DEBATES:
         print(f"⚠️  Skipping {debate_id} (no metadata match)")
         continue
 
-    row = meta_row.iloc[0]
-    year = row["year"]
-    debate_type = row["debate_type"]
-    winner = row["winner"]
-    winner_party = get_winner_party(row)
-
-    df = pd.read_csv(file)
-    df["speaker"] = ""
-    df["party"] = ""
-
-    for idx, norm_speaker in enumerate(df["speaker_normalized"]):
-        speaker_name, party = get_speaker_and_party(norm_speaker, row)
-        df.at[idx, "speaker"] = speaker_name
-        df.at[idx, "party"] = party
-
-    df["winner"] = winner
-    df["winner_party"] = winner_party
-    df["year"] = year
-    df["debate_type"] = debate_type
-    df["debate_id"] = debate_id
-
-    all_rows.append(df)
-
-# === CONCAT & SAVE === #
-final_df = pd.concat(all_rows, ignore_index=True)
+    table = read_utterances(file)
+    all_rows.append(table.append_column("debate_id", constant_column(debate_id, table.num_rows)))
+
+utterances = pa.concat_tables(all_rows).to_pandas()
+
+# === ATTACH METADATA === #
+# one row per debate, joined onto all utterances at once instead of
+# broadcasting each debate's values into its own frame
+meta_small = pd.DataFrame({
+    "debate_id": metadata["filename"],
+    "year": metadata["year"],
+    "debate_type": metadata["debate_type"],
+    "winner": metadata["winner"],
+    "winner_party": get_winner_party(metadata),
+    **{key: meta_str(metadata, key) for key, _ in ROLE_MAP.values() if key},
+})
+final_df = utterances.merge(meta_small, on="debate_id", how="left", validate="many_to_one")
+final_df["speaker"], final_df["party"] = get_speaker_and_party(final_df["speaker_normalized"], final_df)
+
+# === SAVE === #
 final_df = final_df[[
     "text", "speaker_normalized", "speaker", "party",
     "winner", "winner_party", "year", "debate_type", "debate_id"
 ]]
 
-final_df.to_csv(OUTPUT_FILE, index=False)
+pacsv.write_csv(pa.Table.from_pandas(final_df, preserve_index=False), OUTPUT_FILE)
 print(f"✅ Final dataset saved to: {OUTPUT_FILE}")
 print(f"🧾 Total utterances: {len(final_df)}")
\ No newline at end of file
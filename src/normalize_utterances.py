@@ -2,6 +2,8 @@ import os
 import re
 import pandas as pd
 from pathlib import Path
+
+from csv_io import write_csv
 from tqdm import tqdm
 
 # === PATHS === #
@@ -18,6 +20,8 @@ CLEANED_DIR.mkdir(parents=True, exist_ok=True)
 metadata = pd.read_csv(METADATA_FILE)
 metadata.columns = metadata.columns.str.strip()
 metadata["filename"] = metadata["filename"].str.replace(".txt", "", regex=False)
+# debate_id → metadata row (first match wins, as with the old boolean-mask lookup)
+META = metadata.drop_duplicates("filename").set_index("filename").to_dict(orient="index")
 print(f"Loaded metadata with {len(metadata)} rows.")
 
 # === GET ALL UTTERANCE FILES === #
@@ -25,39 +29,47 @@ utterance_files = sorted(PROCESSED_DIR.glob("*_utterances.csv"))
 print(f"Found {len(utterance_files)} utterance files.")
 
 # === NORMALIZE SPEAKER NAMES === #
+_TRAILING_DOTS_RE = re.compile(r"\.+$")
+_PAREN_RE = re.compile(r"\(.*?\)")
+_NONALPHA_RE = re.compile(r"[^a-z\s]")
+_WS_RE = re.compile(r"\s+")
+
 def normalize_speaker_name(name: str) -> str:
     """Cleans and standardizes a speaker name string."""
     if pd.isna(name):
         return ""
     name = name.strip()
-    name = re.sub(r"\.+$", "", name)     # remove trailing periods
-    name = re.sub(r"\s+", " ", name)     # normalize spacing
+    name = _TRAILING_DOTS_RE.sub("", name)   # remove trailing periods
+    name = _WS_RE.sub(" ", name)             # normalize spacing
     name = name.title()                  # uppercase fix
     return name
 
 def clean_for_matching(name: str) -> str:
     """Standardize a name for fuzzy matching (lowercase, remove parentheses etc)."""
     name = str(name).lower().strip()
-    name = re.sub(r"\(.*?\)", "", name)       # remove (Jr), (Sr), (Hillary), etc.
-    name = re.sub(r"[^a-z\s]", "", name)      # remove punctuation
-    name = re.sub(r"\s+", " ", name)          # normalize spacing
+    name = _PAREN_RE.sub("", name)       # remove (Jr), (Sr), (Hillary), etc.
+    name = _NONALPHA_RE.sub("", name)    # remove punctuation
+    name = _WS_RE.sub(" ", name)         # normalize spacing
     return name
 
 # === AMBIGUITY CACHE FOR "PRESIDENT" ETC. === #
 ambiguous_resolution_cache = {}
 
 # === MATCH TO CANONICAL ROLES === #
-def match_role(name: str, canonical_map: dict, debate_id: str) -> str:
+def canonical_token_sets(canonical_map: dict) -> list:
+    """[(role, name tokens)] for a debate's canonical names, computed once per file."""
+    return [
+        (role, set(clean_for_matching(full_name).split()))
+        for full_name, role in canonical_map.items()
+        if full_name
+    ]
+
+def match_role(name: str, canonical_tokens: list, debate_id: str) -> str:
     """Match speaker name to canonical roles using token overlap."""
     name_clean = clean_for_matching(name)
     name_tokens = set(name_clean.split())
 
-    for full_name, role in canonical_map.items():
-        if not full_name:
-            continue
-        candidate_clean = clean_for_matching(full_name)
-        candidate_tokens = set(candidate_clean.split())
-
+    for role, candidate_tokens in canonical_tokens:
         # match if there's any word overlap 
         if name_tokens & candidate_tokens:
             return role
@@ -94,14 +106,12 @@ def normalize_all_speakers():
         try:
             df = pd.read_csv(file)
             debate_id = file.stem.replace("_utterances", "")
-            meta_row = metadata[metadata["filename"] == debate_id]
+            row = META.get(debate_id)
 
-            if meta_row.empty:
+            if row is None:
                 print(f"No metadata for debate_id: {debate_id}, skipping.")
                 continue
 
-            row = meta_row.iloc[0]
-
             # canonical role map 
             canonical_map = {
                 str(row.get("candidate_R", "")): "Candidate_R",
@@ -110,19 +120,24 @@ def normalize_all_speakers():
                 str(row.get("moderator", "")): "Moderator"
             }
 
-            # normalize speaker roles
-            normalized_roles = []
-            for speaker in df["speaker"]:
-                norm_name = normalize_speaker_name(speaker)
-                role = match_role(norm_name, canonical_map, debate_id)
-                normalized_roles.append(role)
+            canonical_tokens = canonical_token_sets(canonical_map)
+
+            # normalize speaker roles: resolve each distinct speaker string once
+            # (in order of first appearance), then map back onto the column
+            role_for = {
+                speaker: match_role(normalize_speaker_name(speaker), canonical_tokens, debate_id)
+                for speaker in df["speaker"].dropna().unique()
+            }
+            normalized_roles = df["speaker"].map(role_for).fillna(
+                match_role(normalize_speaker_name(None), canonical_tokens, debate_id)  # missing speaker
+            )
 
             # insert into dataframe
             df.insert(2, "speaker_normalized", normalized_roles)
 
             # save result
             output_path = CLEANED_DIR / file.name
-            df.to_csv(output_path, index=False)
+            write_csv(df, output_path)
             print(f"Saved: {output_path.name}")
 
         except Exception as e:
@@ -1,6 +1,8 @@
 import pandas as pd
 from pathlib import Path
 
+from csv_io import write_csv
+
 # === PATHS === #
 REPO_DIR = Path(__file__).resolve().parents[1]
 DATA_DIR = REPO_DIR / "data"
@@ -14,7 +16,8 @@ df = pd.read_csv(INPUT_FILE)
 print(f"Loaded debates dataset with {len(df)} rows.")
 
 # === FILTER: DROP MODERATORS === #
-df_candidates = df[df["speaker_normalized"].str.contains("Candidate", na=False)].copy()
+CANDIDATE_ROLES = {"Candidate_R", "Candidate_D", "Candidate_I"}
+df_candidates = df[df["speaker_normalized"].isin(CANDIDATE_ROLES)].copy()
 print(f"Candidate-only utterances: {len(df_candidates)}")
 
 # === KEEP ONLY USEFUL COLUMNS === #
@@ -27,20 +30,21 @@ N_TOTAL = 300
 groups = df_candidates.groupby(["party", "decade"])
 N_PER_GROUP = max(1, N_TOTAL // len(groups))
 
-samples = []
-for (party, decade), group in groups:
-    n = min(N_PER_GROUP, len(group))
-    if n > 0:
-        samples.append(group.sample(n=n, random_state=42))
-
-df_sample = pd.concat(samples).sample(frac=1, random_state=42).reset_index(drop=True)
+# one seeded draw per group; selecting the columns explicitly keeps the grouping
+# columns in each group frame across pandas versions
+df_sample = (
+    df_candidates.groupby(["party", "decade"], group_keys=False)[df_candidates.columns.tolist()]
+    .apply(lambda g: g.sample(n=min(N_PER_GROUP, len(g)), random_state=42))
+    .sample(frac=1, random_state=42)
+    .reset_index(drop=True)
+)
 
 # add empty label column
 df_sample["label"] = ""  # to be filled with attack / acclaim / defense
 
 # === SAVE ANNOTATION DATASET === #
 OUT_FILE = ANNOTATION_DIR / "debates_rhetoric_annotation.csv"
-df_sample.to_csv(OUT_FILE, index=False)
+write_csv(df_sample, OUT_FILE)
 
 print(f"Saved balanced annotation dataset: {OUT_FILE} ({len(df_sample)} rows)")
 print(df_sample.head(10))
\ No newline at end of file
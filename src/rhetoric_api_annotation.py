@@ -1,9 +1,13 @@
 # === RHETORICAL LABELING PIPELINE (FEW-SHOT, API) ===
 import pandas as pd
 from pathlib import Path
+
+from csv_io import write_csv
 from tqdm import tqdm
 import random
 import re
+import shelve
+import hashlib
 
 # === PATHS ===
 REPO_DIR = Path(__file__).resolve().parents[1]
@@ -11,6 +15,7 @@ DATA_DIR = REPO_DIR / "data"
 ANNOTATED_FILE = DATA_DIR / "rhetoric" / "annotated_debates_rhetoric.csv"
 DEBATES_FILE   = DATA_DIR / "debates_df_themes.csv"
 OUTPUT_FILE    = DATA_DIR / "rhetoric" / "debates_rhetoric.csv"
+CACHE_FILE     = REPO_DIR / ".cache" / "openai_rhetoric"   # shelve db of labels
 
 # === LOAD DATA ===
 df_fewshot = pd.read_csv(ANNOTATED_FILE).dropna(subset=["label"]).reset_index(drop=True)
@@ -54,39 +59,89 @@ Text: "{utterance}"
 Label:"""
 
 # === OPENAI API CONFIG ===
-from openai import OpenAI
-client = OpenAI(api_key="")
+import asyncio
+from openai import AsyncOpenAI
+aclient = AsyncOpenAI(api_key="")
+
+MODEL_NAME      = "gpt-4o-mini"
+MAX_CONCURRENCY = 20      # API requests in flight at once
+MAX_ATTEMPTS    = 5       # per utterance, for rate limits / timeouts
+BACKOFF_BASE_S  = 1.0
+BACKOFF_MAX_S   = 30.0
+SYNC_EVERY      = 100     # flush the label cache every this many utterances
+
+# changes whenever the instructions or sampled few-shots change, invalidating old labels
+PROMPT_VERSION = hashlib.sha256(make_prompt("").encode("utf-8")).hexdigest()[:12]
 
 valid_labels = {"attack", "acclaim", "defense"}
+# one scan for any label; no \b so "Attacks" / "attacking" still count, as with `in`
+_LABEL_RE = re.compile("|".join(sorted(valid_labels)))
 
 def clean_label(raw_label: str) -> str:
     """Normalize and extract the label."""
     raw_label = raw_label.strip().lower()  # normalize to lowercase
-    for lbl in valid_labels:
-        if lbl in raw_label:
-            return lbl
-    return "unspecified"  # fallback
-
-def classify_batch(texts):
-    results = []
-    for text in tqdm(texts, desc="Classifying"):
+    m = _LABEL_RE.search(raw_label)
+    return m.group(0) if m else "unspecified"  # fallback
+
+def is_retryable(e: Exception) -> bool:
+    msg = str(e).lower()
+    return any(k in msg for k in ["rate limit", "429", "please try again", "timeout", "connection"])
+
+def cache_key(text: str) -> str:
+    return hashlib.sha256(f"{MODEL_NAME}|{PROMPT_VERSION}|{text}".encode("utf-8")).hexdigest()
+
+async def classify_one(semaphore: asyncio.Semaphore, text: str, cache) -> str:
+    key = cache_key(text)
+    if key in cache:
+        return cache[key]
+    backoff = BACKOFF_BASE_S
+    for attempt in range(1, MAX_ATTEMPTS + 1):
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": make_prompt(text)},
-                ],
-                temperature=0.0,
-                max_tokens=5
-            )
+            async with semaphore:
+                response = await aclient.chat.completions.create(
+                    model=MODEL_NAME,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": make_prompt(text)},
+                    ],
+                    temperature=0.0,
+                    max_tokens=5
+                )
             raw = response.choices[0].message.content
             label = clean_label(raw)
-            results.append(label)
+            cache[key] = label  # only successful calls are cached, so failures retry next run
+            return label
         except Exception as e:
-            print("[ERROR]", e)
-            results.append("unspecified")
-    return results
+            if attempt == MAX_ATTEMPTS or not is_retryable(e):
+                print("[ERROR]", e)
+                return "unspecified"
+            sleep_s = min(BACKOFF_MAX_S, backoff * (1.5 + random.random()))
+            await asyncio.sleep(sleep_s)
+            backoff = sleep_s
+
+async def classify_unique(unique_texts: list, cache) -> dict:
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    pbar = tqdm(total=len(unique_texts), desc="Classifying")
+
+    async def run(text):
+        label = await classify_one(semaphore, text, cache)
+        pbar.update(1)
+        if pbar.n % SYNC_EVERY == 0:
+            cache.sync()
+        return label
+
+    labels = await asyncio.gather(*[run(t) for t in unique_texts])
+    pbar.close()
+    return dict(zip(unique_texts, labels))
+
+def classify_batch(texts):
+    # repeated utterances ("Thank you.", "That's not true.") are classified once
+    unique_texts = list(dict.fromkeys(texts))
+    print(f"[INFO] {len(texts)} utterances, {len(unique_texts)} unique")
+    CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with shelve.open(str(CACHE_FILE)) as cache:
+        label_for = asyncio.run(classify_unique(unique_texts, cache))
+    return [label_for[t] for t in texts]
 
 # === RUN CLASSIFICATION ===
 texts = df_debates["text"].fillna("").tolist()
@@ -101,7 +156,7 @@ cols_keep = ["utterance_id", "debate_id", "speaker", "party", "text", "rhetoric_
 # make sure columns exist (some datasets may not have all)
 cols_keep = [c for c in cols_keep if c in df_debates.columns]
 df_slim = df_debates[cols_keep]
-df_slim.to_csv(OUTPUT_FILE, index=False)
+write_csv(df_slim, OUTPUT_FILE)
 
 print(f"[DONE] Saved slim labeled dataset: {OUTPUT_FILE}")
 print(df_slim.head())
@@ -1,8 +1,12 @@
 import os
 import re
+import mmap
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
 from pathlib import Path
+
+from csv_io import write_csv
 from tqdm import tqdm
 
 # === PATHS === #
@@ -81,48 +85,73 @@ logging.basicConfig(
 )
 
 # === REGEX PATTERNS FOR CAPS FORMATS === #
+# bytes patterns, run directly over the memory-mapped file; NL matches \r\n, a lone
+# \r or \n as one newline, as text-mode reads translated all three to \n.
+# each format is split into the speaker head and the boundary that ends the
+# content, instead of one lazy `(.*?)(?=boundary|\Z)` pattern that re-tries the
+# lookahead at every byte of every utterance
+NL = rb"(?:\r\n?|\n)"
 PATTERNS = {
-    "all_caps_inline": re.compile(r"\n?([A-Z ]{2,}):\s?(.*?)(?=\n[A-Z ]{2,}:|\Z)", re.DOTALL),
-    "all_caps_newline": re.compile(r"\n?([A-Z ]{2,}):\n(.*?)(?=\n[A-Z ]{2,}:|\Z)", re.DOTALL)
+    "all_caps_inline": re.compile(NL + rb"?([A-Z ]{2,}):(?:\r\n?|\s)?"),
+    "all_caps_newline": re.compile(NL + rb"?([A-Z ]{2,}):" + NL)
 }
+BOUNDARY_RE = re.compile(NL + rb"[A-Z ]{2,}:")
+
+def iter_utterances(buf, head):
+    """(speaker bytes, content bytes) for each utterance; same spans as head + (.*?)(?=boundary|\Z)."""
+    pos, end = 0, len(buf)
+    while True:
+        m = head.search(buf, pos)
+        if m is None:
+            return
+        start = m.end()
+        b = BOUNDARY_RE.search(buf, start)
+        pos = b.start() if b else end
+        yield m.group(1), buf[start:pos]
 
 # === TITLE SPEAKER DETECTION === #
+_PREFIXES = [
+    'Mr\\.', 'Ms\\.', 'Mrs\\.', 'President', 'The President',
+    'Governor', 'Gov\\.', 'Senator', 'Sen\\.', 'Question', 'Q', 'Moderator'
+]
+# standalone titles or title + name, followed by a period (compiled once, not per line)
+_SPEAKER_LINE_RE = re.compile(r'^(?:' + '|'.join(_PREFIXES) + r')(?:\s+[A-Z][a-z]+)?\.$')
+
 def is_speaker_line(line, max_len=30):
     line = line.strip()
-    prefixes = [
-        'Mr\\.', 'Ms\\.', 'Mrs\\.', 'President', 'The President',
-        'Governor', 'Gov\\.', 'Senator', 'Sen\\.', 'Question', 'Q', 'Moderator'
-    ]
-    # match standalone titles or title + name, followed by a period
-    pattern = r'^(' + '|'.join(prefixes) + r')(?:\s+[A-Z][a-z]+)?\.$'
-    return len(line) <= max_len and line.endswith('.') and re.match(pattern, line)
+    return len(line) <= max_len and line.endswith('.') and _SPEAKER_LINE_RE.match(line) is not None
 
 # === PARSERS === #
+def decode_slice(raw: bytes) -> str:
+    # text-mode reads translated \r\n and \r to \n; do the same per matched slice
+    return raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
 def parse_regex_format(file_path, pattern, debate_id):
-    # read entire file content
-    with open(file_path, "r", encoding="utf-8") as f:
-        text = f.read()
-
-    utterances = []
-    # extract all matches using the regex pattern
-    for i, match in enumerate(re.finditer(pattern, text)):
-        speaker = match.group(1).strip()
-        content = match.group(2).strip().replace("\n", " ")
-        utterances.append({
-            "utterance_id": f"{debate_id}_{i+1}",
-            "debate_id": debate_id,
-            "speaker": speaker,
-            "text": content
-        })
-
-    return pd.DataFrame(utterances)
+    speakers, texts = [], []
+    with open(file_path, "rb") as f:
+        # mmap can't map an empty file
+        if os.fstat(f.fileno()).st_size > 0:
+            # scan the OS-mapped bytes instead of a decoded copy of the whole file;
+            # only the matched speaker/content slices are decoded
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for raw_speaker, raw_content in iter_utterances(mm, pattern):
+                    speakers.append(decode_slice(raw_speaker).strip())
+                    texts.append(decode_slice(raw_content).strip().replace("\n", " "))
+
+    # build column-wise; debate_id is broadcast
+    return pd.DataFrame({
+        "utterance_id": [f"{debate_id}_{i+1}" for i in range(len(speakers))],
+        "debate_id": debate_id,
+        "speaker": speakers,
+        "text": texts
+    })
 
 def parse_title_newline_format(file_path, debate_id):
     # read file line by line
     with open(file_path, "r", encoding="utf-8") as f:
         lines = f.read().splitlines()
 
-    utterances = []
+    speakers, texts = [], []
     current_speaker = None
     current_utterance = []
 
@@ -130,11 +159,8 @@ def parse_title_newline_format(file_path, debate_id):
         if is_speaker_line(line):
             # save previous speaker's utterance
             if current_speaker and current_utterance:
-                utterances.append({
-                    "debate_id": debate_id,
-                    "speaker": current_speaker.rstrip('.'),
-                    "text": ' '.join(current_utterance).strip()
-                })
+                speakers.append(current_speaker.rstrip('.'))
+                texts.append(' '.join(current_utterance).strip())
                 current_utterance = []
             current_speaker = line.strip()
         else:
@@ -143,17 +169,43 @@ def parse_title_newline_format(file_path, debate_id):
 
     # append final utterance if exists
     if current_speaker and current_utterance:
-        utterances.append({
-            "debate_id": debate_id,
-            "speaker": current_speaker.rstrip('.'),
-            "text": ' '.join(current_utterance).strip()
-        })
+        speakers.append(current_speaker.rstrip('.'))
+        texts.append(' '.join(current_utterance).strip())
 
-    df = pd.DataFrame(utterances)
-    df.insert(0, "utterance_id", range(1, len(df) + 1))
-    return df
+    return pd.DataFrame({
+        "utterance_id": range(1, len(speakers) + 1),
+        "debate_id": debate_id,
+        "speaker": speakers,
+        "text": texts
+    })
 
 # === MAIN RUNNER === #
+WORKERS = os.cpu_count() or 1
+
+def _process_one(format_type, filename):
+    """Parse and save one transcript; returns (log level, message) for the parent to report."""
+    file_path = RAW_DIR / filename
+    debate_id = filename.replace(".txt", "")
+
+    if not file_path.exists():
+        return logging.WARNING, f"❌ File not found: {filename}"
+
+    try:
+        # select parser based on format type
+        if format_type in ["all_caps_inline", "all_caps_newline"]:
+            df = parse_regex_format(file_path, PATTERNS[format_type], debate_id)
+        elif format_type == "title_newline":
+            df = parse_title_newline_format(file_path, debate_id)
+        else:
+            return logging.ERROR, f"⚠️ Unknown format type: {format_type}"
+
+        # save output to processed directory
+        output_path = PROCESSED_DIR / f"{debate_id}_utterances.csv"
+        write_csv(df, output_path)
+        return logging.INFO, f"✅ {len(df)} utterances extracted from {filename}"
+    except Exception as e:
+        return logging.ERROR, f"❌ Failed to process {filename}: {e}"
+
 def process_utterances():
     logging.info("Starting utterance extraction...")
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
@@ -162,42 +214,18 @@ def process_utterances():
     total_files = sum(len(files) for files in DEBATE_FILES.values())
     pbar = tqdm(total=total_files, desc="Processing debates", ncols=100)
 
-    for format_type, file_list in DEBATE_FILES.items():
-        for filename in file_list:
-            file_path = RAW_DIR / filename
-            debate_id = filename.replace(".txt", "")
-
-            if not file_path.exists():
-                msg = f"❌ File not found: {filename}"
-                print(msg)
-                logging.warning(msg)
-                pbar.update(1)
-                continue
-
-            try:
-                # select parser based on format type
-                if format_type in ["all_caps_inline", "all_caps_newline"]:
-                    df = parse_regex_format(file_path, PATTERNS[format_type], debate_id)
-                elif format_type == "title_newline":
-                    df = parse_title_newline_format(file_path, debate_id)
-                else:
-                    msg = f"⚠️ Unknown format type: {format_type}"
-                    print(msg)
-                    logging.error(msg)
-                    pbar.update(1)
-                    continue
-
-                # save output to processed directory
-                output_path = PROCESSED_DIR / f"{debate_id}_utterances.csv"
-                df.to_csv(output_path, index=False)
-                msg = f"✅ {len(df)} utterances extracted from {filename}"
-                print(msg)
-                logging.info(msg)
-            except Exception as e:
-                msg = f"❌ Failed to process {filename}: {e}"
-                print(msg)
-                logging.error(msg)
-
+    # files are independent, so parse them in parallel; workers save their own
+    # CSV and only the status message comes back to be printed/logged here
+    with ProcessPoolExecutor(max_workers=WORKERS) as ex:
+        futures = [
+            ex.submit(_process_one, format_type, filename)
+            for format_type, file_list in DEBATE_FILES.items()
+            for filename in file_list
+        ]
+        for fut in as_completed(futures):
+            level, msg = fut.result()
+            print(msg)
+            logging.log(level, msg)
             pbar.update(1)
 
     pbar.close()
@@ -2,6 +2,9 @@
 # track how selected political keywords drift in meaning across decades
 # using canonicalized anchors (aliases collapsed)
 
+import os
+import sys
+import copy
 import pandas as pd
 import numpy as np
 from pathlib import Path
@@ -9,7 +12,7 @@ from gensim.models import Word2Vec
 from gensim.utils import simple_preprocess
 from tqdm import tqdm
 import json
-from sklearn.metrics.pairwise import cosine_similarity
+from collections import Counter
 
 # === PATHS ===
 REPO_DIR   = Path(__file__).resolve().parents[1]
@@ -24,7 +27,9 @@ MIN_WORDS = 8     # skip utterances shorter than this
 EMB_SIZE = 100
 WINDOW = 5
 MIN_COUNT = 3
-WORKERS = 4
+WORKERS = os.cpu_count() or 4
+BASE_EPOCHS = 5   # shared model on all decades
+EPOCHS = 20       # per-decade fine-tuning
 
 # === ANCHORS & ALIASES (canonicalization) ===
 ANCHORS = {
@@ -32,6 +37,8 @@ ANCHORS = {
     "america": ["america", "american", "americans"],
     "taxes": ["tax", "taxes", "taxation", "taxpayer", "taxpayers"]
 }
+# interned so every canonicalized token points at the same string object
+ANCHORS = {sys.intern(anchor): aliases for anchor, aliases in ANCHORS.items()}
 
 # === REVERSE LOOKUP FOR CANONICALIZATION ===
 ALIAS2ANCHOR = {}
@@ -42,47 +49,74 @@ for anchor, aliases in ANCHORS.items():
 # === LOAD DATA ===
 print(f"[INFO] Reading {INPUT_FILE}")
 df = pd.read_csv(INPUT_FILE)
+df = df.dropna(subset=["text"])  # empty utterances contribute no tokens
 
 # === BASIC TOKENIZATION & CANONICALIZATION ===
-def preprocess_and_canonicalize(text):
-    if pd.isna(text):
-        return []
-    tokens = simple_preprocess(str(text), deacc=True, min_len=2)
-    canonicalized = [ALIAS2ANCHOR.get(tok, tok) for tok in tokens]
-    return canonicalized
+def preprocess_and_canonicalize(text, _get=ALIAS2ANCHOR.get, _pre=simple_preprocess):
+    # lookups bound as defaults to skip global/attribute resolution per token
+    return [_get(tok, tok) for tok in _pre(text, deacc=True, min_len=2)]
 
-df["tokens"] = df["text"].apply(preprocess_and_canonicalize)
+df["tokens"] = [preprocess_and_canonicalize(t) for t in df["text"].astype(str).to_numpy()]
 
 # use existing decade column
 decades = sorted(df["decade"].dropna().unique())
 print(f"[INFO] Found decades: {decades}")
 
+# === PER-DECADE TOKEN STATS ===
+# utterances containing each token (set → counted once per utterance) and raw
+# token frequency, per decade
+decade_counts, decade_freqs = {}, {}
+for dec, tokens in df.groupby("decade")["tokens"]:
+    decade_counts[dec] = Counter(tok for toks in tokens for tok in set(toks))
+    decade_freqs[dec] = Counter(tok for toks in tokens for tok in toks)
+
 # === TRAIN W2V MODELS PER DECADE ===
+# one base model on all decades fixes a shared vocabulary and starting vectors;
+# each decade is a copy of it fine-tuned on that decade only, so the vector
+# spaces stay aligned and similarity across decades is meaningful
+base = Word2Vec(
+    sentences=df["tokens"].tolist(),
+    vector_size=EMB_SIZE,
+    window=WINDOW,
+    min_count=MIN_COUNT,
+    workers=WORKERS,
+    sg=1,  # skip-gram (better for semantics)
+    epochs=BASE_EPOCHS,
+    compute_loss=False
+)
+print(f"[INFO] Trained base Word2Vec on {len(df)} utterances ({len(base.wv)} words)")
+
 models = {}
 for dec in decades:
     corpus = df.loc[df["decade"] == dec, "tokens"].tolist()
     # skip if no tokens
     if len(corpus) == 0:
         continue
-    model = Word2Vec(
-        sentences=corpus,
-        vector_size=EMB_SIZE,
-        window=WINDOW,
-        min_count=MIN_COUNT,
-        workers=WORKERS,
-        sg=1,  # skip-gram (better for semantics)
-        epochs=20
-    )
+    model = copy.deepcopy(base)
+    model.train(corpus, total_examples=len(corpus), epochs=EPOCHS, compute_loss=False)
     models[dec] = model.wv
     print(f"[INFO] Trained Word2Vec for {dec}s on {len(corpus)} utterances")
 
+def decade_neighbors(wv, word, freqs, topn=10):
+    """Nearest words that are actually in use in this decade (the vocabulary is shared)."""
+    sims = wv.most_similar(word, topn=None)  # similarity to every vocab word
+    neighbors = []
+    for j in np.argsort(-sims):
+        w = wv.index_to_key[j]
+        if w != word and freqs.get(w, 0) >= MIN_COUNT:
+            neighbors.append(w)
+            if len(neighbors) == topn:
+                break
+    return neighbors
+
 # === ANALYZE DRIFT ===
 rows = []
 for word in ANCHORS.keys():   # iterate over canonical anchors only
     prev_vec = None
     for dec in decades:
         wv = models.get(dec, None)
-        if wv is None or word not in wv.key_to_index:
+        # with a shared vocab, "missing" = below MIN_COUNT in this decade's own text
+        if wv is None or word not in wv.key_to_index or decade_freqs[dec].get(word, 0) < MIN_COUNT:
             rows.append({
                 "word": word,
                 "decade": dec,
@@ -93,20 +127,16 @@ for word in ANCHORS.keys():   # iterate over canonical anchors only
             continue
 
         # frequency (utterances containing this anchor)
-        utterance_count = sum(word in toks for toks in df.loc[df["decade"] == dec, "tokens"])
+        utterance_count = decade_counts[dec].get(word, 0)
 
         # neighbors (semantic field)
-        neighbors = []
-        try:
-            neighbors = [w for w, _ in wv.most_similar(word, topn=10)]
-        except KeyError:
-            neighbors = []
+        neighbors = decade_neighbors(wv, word, decade_freqs[dec])
 
         # similarity to previous decade
         vec = wv[word]
         sim = np.nan
         if prev_vec is not None:
-            sim = float(cosine_similarity([vec], [prev_vec])[0][0])
+            sim = float(np.dot(vec, prev_vec) / (np.linalg.norm(vec) * np.linalg.norm(prev_vec)))
         prev_vec = vec
 
         rows.append({